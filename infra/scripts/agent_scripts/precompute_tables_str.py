@@ -0,0 +1,126 @@
+"""
+Build step that renders the table/column summary used by the SQL agent instructions.
+
+Parses infra/scripts/fabric_scripts/sql_files/tables.json once and writes the numbered
+table/columns block to a UTF-8 sidecar (tables_str.txt) so that 01_create_agents.py can
+read the pre-formatted string instead of parsing the JSON on every run. The SHA-256 of
+tables.json is stored next to the sidecar so a stale summary is never reused.
+"""
+import argparse
+import hashlib
+import mmap
+import os
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Prefer a C-backed JSON parser; orjson parses buffer-protocol objects in place,
+# the fallbacks need the buffer copied to bytes first.
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    try:
+        from ujson import loads as _loads
+    except ImportError:
+        from json import loads as _loads
+
+    def json_loads(buf):
+        return _loads(bytes(buf))
+
+# Use the location of tables.json in infra/scripts/fabric_scripts/sql_files/tables.json
+TABLES_JSON_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'fabric_scripts', 'sql_files', 'tables.json'))
+TABLES_STR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables_str.txt')
+
+
+def iter_tables(file_path=TABLES_JSON_PATH):
+    """
+    Yields the table definitions from tables.json one at a time.
+
+    Uses ijson to stream the "tables" array when it is installed so the full document is
+    never materialized; otherwise parses the memory-mapped file in one go.
+
+    Args:
+        file_path (str): Path to tables.json.
+
+    Yields:
+        dict: A table definition with "tablename" and "columns" keys.
+    """
+    if ijson is not None:
+        with open(file_path, "rb") as f:
+            yield from ijson.items(f, 'tables.item')
+        return
+
+    # Memory-map the file so the parse is backed by the page cache instead of a bytes copy
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            data = json_loads(view)
+    yield from data['tables']
+
+
+def build_tables_str(file_path=TABLES_JSON_PATH):
+    """
+    Formats the tables and columns defined in tables.json into the numbered block
+    embedded in the SQL agent instructions.
+
+    Args:
+        file_path (str): Path to tables.json.
+
+    Returns:
+        str: The formatted tables string.
+    """
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"Could not find tables.json at {file_path}")
+
+    return "".join(
+        f"\n {i}.Table:dbo.{t['tablename']}\n        Columns: {', '.join(t['columns'])}"
+        for i, t in enumerate(iter_tables(file_path), 1)
+    )
+
+
+def tables_fingerprint(file_path=TABLES_JSON_PATH):
+    """
+    Returns the SHA-256 hex digest of tables.json.
+    """
+    with open(file_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def read_cached_tables_str(fingerprint, tables_str_path=TABLES_STR_PATH):
+    """
+    Returns the pre-rendered tables summary if it was built from a tables.json with the
+    given fingerprint, otherwise None.
+    """
+    try:
+        with open(tables_str_path + ".sha256", "r", encoding="utf-8") as f:
+            if f.read().strip() != fingerprint:
+                return None
+        with open(tables_str_path, "r", encoding="utf-8", newline="") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def write_tables_str(tables_str, fingerprint, tables_str_path=TABLES_STR_PATH):
+    """
+    Writes the tables summary sidecar together with the fingerprint of its source.
+    """
+    with open(tables_str_path, "w", encoding="utf-8", newline="") as f:
+        f.write(tables_str)
+    with open(tables_str_path + ".sha256", "w", encoding="utf-8") as f:
+        f.write(fingerprint)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--tables_json", default=TABLES_JSON_PATH)
+    p.add_argument("--output", default=TABLES_STR_PATH)
+    args = p.parse_args()
+
+    fingerprint = tables_fingerprint(args.tables_json)
+    if read_cached_tables_str(fingerprint, args.output) is not None:
+        print(f"Tables summary at {args.output} is up to date")
+    else:
+        write_tables_str(build_tables_str(args.tables_json), fingerprint, args.output)
+        print(f"Tables summary written to {args.output}")
@@ -87,6 +87,10 @@ requirementFile="infra/scripts/agent_scripts/requirements.txt"
 python -m pip install --upgrade pip
 python -m pip install --quiet -r "$requirementFile"
 
+# Pre-render the tables summary used by the SQL agent instructions
+echo "Rendering tables summary from tables.json..."
+python infra/scripts/agent_scripts/precompute_tables_str.py
+
 # Execute the Python scripts
 echo "Running Python agents creation script..."
 # python 01_create_agents.py
@@ -1,3 +1,5 @@
+import os
+
 from azure.identity import ManagedIdentityCredential, DefaultAzureCredential
 
 APP_ENV = 'dev'  # Change to 'dev' for local development
@@ -6,6 +8,9 @@ def get_azure_credential(client_id=None):
     """
     Retrieves the appropriate Azure credential based on the application environment.
 
+    If a managed identity client ID is given, a ManagedIdentityCredential is returned
+    directly, skipping the DefaultAzureCredential probe chain; set AZURE_LOCAL=1 to ignore
+    the client ID and use the environment-based selection below for local runs.
     If the application is running locally, it uses Azure CLI credentials.
     Otherwise, it uses a managed identity credential.
 
@@ -16,7 +21,9 @@ def get_azure_credential(client_id=None):
         azure.identity.DefaultAzureCredential or azure.identity.ManagedIdentityCredential: 
         The Azure credential object.
     """
+    if client_id and os.getenv("AZURE_LOCAL") != "1":
+        return ManagedIdentityCredential(client_id=client_id)
     if APP_ENV == 'dev':
         return DefaultAzureCredential() # CodeQL [SM05139] Okay use of DefaultAzureCredential as it is only used in development
     else:
-        return ManagedIdentityCredential(client_id=client_id)
\ No newline at end of file
+        return ManagedIdentityCredential(client_id=client_id)
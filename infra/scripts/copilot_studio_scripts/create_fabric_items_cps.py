@@ -1,19 +1,88 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
 import time
 import json
 import base64
 import os
+from concurrent.futures import ThreadPoolExecutor
 from azure.identity import AzureCliCredential
 
+try:
+    from requests_toolbelt import MultipartEncoder
+except ImportError:
+    MultipartEncoder = None
+
+# orjson serializes straight to bytes and parses bytes without decoding them first
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_dumps_bytes(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+def json_loads(content):
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+# pybase64 is a SIMD-accelerated drop-in for the base64 module
+try:
+    import pybase64 as b64
+except ImportError:
+    b64 = base64
+
+def payload_base64(obj):
+    # InlineBase64 definition part for a JSON document; base64 output is plain ASCII
+    return b64.b64encode(json_dumps_bytes(obj)).decode('ascii')
+
+# A single Azure CLI credential is shared by all calls; tokens are cached per scope and
+# only refreshed when they are within 5 minutes of expiry.
+credential = AzureCliCredential()
+token_cache = {}
+token_lock = threading.Lock()
+
+def get_token(scope):
+    with token_lock:
+        token = token_cache.get(scope)
+        if token is None or token.expires_on - time.time() < 300:
+            token = token_cache[scope] = credential.get_token(scope)
+    return token
+
 def get_fabric_headers():
-    credential = AzureCliCredential()
-    cred = credential.get_token('https://api.fabric.microsoft.com/.default')
-    token = cred.token
+    token = get_token('https://api.fabric.microsoft.com/.default').token
     fabric_headers = {"Authorization": "Bearer " + token.strip()}
     return(fabric_headers)
 
+# Reuse pooled keep-alive connections to the Fabric API across all calls; idempotent
+# requests are retried on throttling and transient server errors, honoring Retry-After.
+session = requests.Session()
+session.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=5, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False),
+))
+
 fabric_headers = get_fabric_headers()
 
+
+def poll_until(fetch, is_done, initial=2, max_wait=60, deadline=600):
+    # Calls fetch() until is_done(result) holds, backing off initial, 2 * initial, ... seconds
+    # (capped at max_wait) between attempts. Gives up after deadline seconds (None waits
+    # indefinitely) and returns the last result either way.
+    wait_seconds = initial
+    give_up_at = None if deadline is None else time.monotonic() + deadline
+    while True:
+        result = fetch()
+        if is_done(result) or (give_up_at is not None and time.monotonic() >= give_up_at):
+            return result
+        time.sleep(min(wait_seconds, max_wait))
+        wait_seconds *= 2
+
 solutionname = ""
 workspaceId = ""
 
@@ -30,56 +99,136 @@ fabric_sql_url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/
 
 fabric_create_workspace_url = f"https://api.fabric.microsoft.com/v1/workspaces"
 
-# create environment 
 env_name = 'env_' + solutionname
 fabric_env_url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/environments"
-env_json ={
-  "displayName": env_name,
-  "description": "environment for " + solutionname,
-}
-
-env_res = requests.post(fabric_env_url, headers=fabric_headers, json=env_json)
-print(env_res.json())
-environmentId = env_res.json()['id']
-
-# upload yml file
-url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/environments/{environmentId}/staging/libraries"
-file_path='environment.yml'
-files = {'file': open(file_path, 'rb')}
-
-response = requests.post(url=url, files=files, headers=fabric_headers)
-print(response.status_code)
-print(response.json())
-
-# publish environment
-publish_url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/environments/{environmentId}/staging/publish"
-publish_env = requests.post(publish_url, headers=fabric_headers)
-print(publish_env.status_code)
-print(publish_env.json())
-
-# get environment details
-env_details_url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/environments/{environmentId}"
-env_details = requests.get(env_details_url, headers=fabric_headers)
-env_details_json = env_details.json()
-print('env details: ', env_details_json)
-
-
-# create lakehouse
-lakehouse_data = {
-  "displayName": lakehouse_name,
-  "type": "Lakehouse"
-}
-lakehouse_res = requests.post(fabric_items_url, headers=fabric_headers, json=lakehouse_data)
-# print(lakehouse_res.json())
-lakehouseId = lakehouse_res.json()['id']
+
+
+def create_environment():
+    # create environment
+    env_json ={
+      "displayName": env_name,
+      "description": "environment for " + solutionname,
+    }
+
+    env_res = session.post(fabric_env_url, headers=fabric_headers, json=env_json)
+    print(env_res.json())
+    environmentId = env_res.json()['id']
+
+    # upload yml file
+    url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/environments/{environmentId}/staging/libraries"
+    file_path='environment.yml'
+    with open(file_path, 'rb') as fh:
+        if MultipartEncoder is not None:
+            # stream the multipart body from the open file instead of building it in memory
+            encoder = MultipartEncoder(fields={'file': (os.path.basename(file_path), fh, 'application/octet-stream')})
+            response = session.post(url=url, data=encoder, headers={**fabric_headers, 'Content-Type': encoder.content_type})
+        else:
+            response = session.post(url=url, files={'file': (os.path.basename(file_path), fh)}, headers=fabric_headers)
+    print(response.status_code)
+    print(response.json())
+
+    # publish environment
+    publish_url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/environments/{environmentId}/staging/publish"
+    publish_env = session.post(publish_url, headers=fabric_headers)
+    print(publish_env.status_code)
+    print(publish_env.json())
+
+    # get environment details
+    env_details_url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/environments/{environmentId}"
+    env_details = session.get(env_details_url, headers=fabric_headers)
+    env_details_json = env_details.json()
+    print('env details: ', env_details_json)
+
+    def get_env_details():
+        print('publishing is running')
+        env_details_json = json_loads(session.get(env_details_url, headers=fabric_headers).content)
+        print(env_details_json)
+        return env_details_json
+
+    # wait for the publish here, on the worker thread, so it is polled while the SQL
+    # database LRO, the data load and the shortcuts progress on the other threads; the
+    # publish can also be Waiting or Cancelling before it reaches a final state
+    publish_final_states = ('Success', 'Failed', 'Cancelled')
+    if env_details_json['properties']['publishDetails']['state'] not in publish_final_states:
+        env_details_json = poll_until(
+            get_env_details,
+            lambda details: details['properties']['publishDetails']['state'] in publish_final_states,
+            initial=10,
+            max_wait=60,
+            deadline=None,
+        )
+    return environmentId, env_details_json
+
+
+def create_lakehouse():
+    # create lakehouse
+    lakehouse_data = {
+      "displayName": lakehouse_name,
+      "type": "Lakehouse"
+    }
+    lakehouse_res = session.post(fabric_items_url, headers=fabric_headers, json=lakehouse_data)
+    # print(lakehouse_res.json())
+    return lakehouse_res
+
+
+def create_sql_database():
+    # create sql db
+    sqldb_data = {
+      "displayName": sqldb_name,
+      "description": "SQL Database"
+    }
+    sqldb_res = session.post(fabric_sql_url, headers=fabric_headers, json=sqldb_data)
+    if sqldb_res.status_code == 202:
+        print("sql database creation accepted with status 202")
+
+        # print(sqldb_res.headers)
+        retry_url = sqldb_res.headers.get("Location")
+
+        def get_sqldb_status():
+            print("Polling sql database creation...")
+            return session.get(retry_url, headers=fabric_headers)
+
+        # the operation is not reported before Retry-After, and only Succeeded/Failed are
+        # final: it can still be NotStarted when polling begins
+        retry_after = int(sqldb_res.headers.get("Retry-After"))
+        time.sleep(retry_after)
+        retry_response = poll_until(
+            get_sqldb_status,
+            lambda r: json_loads(r.content)['status'] in ('Succeeded', 'Failed'),
+            max_wait=retry_after,
+            deadline=None,
+        )
+
+        print('sql database created',retry_response.json()['status'])
+        if retry_response.json()['status'] == 'Succeeded':
+            # the created item is served from the operation's result URL
+            result_url = retry_response.headers.get("Location") or retry_url.rstrip('/') + '/result'
+            return session.get(result_url, headers=fabric_headers).json()
+
+    elif sqldb_res.status_code in (200, 201):
+        print('sql database created')
+        return sqldb_res.json()
+    else:
+        print(f"sql database creation failed with status: {sqldb_res.status_code}")
+        print(sqldb_res.text)
+    return None
+
+
+# The environment, lakehouse and SQL database do not depend on each other, so their
+# creation (and the long-running publish / provisioning) runs concurrently.
+executor = ThreadPoolExecutor(max_workers=3)
+env_future = executor.submit(create_environment)
+sqldb_future = executor.submit(create_sql_database)
+lakehouse_res = executor.submit(create_lakehouse).result()
+# parsed once and shared by everything below, including every notebook
+lh = lakehouse_res.json()
+lakehouseId = lh['id']
 
 
 # copy local files to lakehouse
 from azure.storage.filedatalake import (
     DataLakeServiceClient
 )
-from azure.identity import AzureCliCredential
-credential = AzureCliCredential()
 
 account_name = "onelake" #always onelake
 data_path = f"{lakehouse_name}.Lakehouse/Files/"
@@ -89,7 +238,7 @@ account_url = f"https://{account_name}.dfs.fabric.microsoft.com"
 service_client = DataLakeServiceClient(account_url, credential=credential)
 
 # # get workspace name
-ws_res = requests.get(fabric_base_url, headers=fabric_headers)
+ws_res = session.get(fabric_base_url, headers=fabric_headers)
 # print(ws_res.json())
 workspace_name = ws_res.json()['displayName']
 
@@ -98,189 +247,179 @@ file_system_client = service_client.get_file_system_client(workspace_name)
 
 directory_client = file_system_client.get_directory_client(f"{data_path}/{folder_path}")
 
+# tables.json is read once: the parsed copy drives the shortcut creation below and the
+# raw bytes are uploaded to the lakehouse in the background
+file_path = "../fabric_scripts/sql_files/tables.json"
+with open(file_path, "rb") as f:
+    tables_json_bytes = f.read()
+data = json_loads(tables_json_bytes)
+
 print('uploading files')
-# upload audio files
 file_client = directory_client.get_file_client("data/" + 'tables.json')
-with open(file='../fabric_scripts/sql_files/tables.json', mode="rb") as data:
-        # print('data', data)
-    file_client.upload_data(data, overwrite=True)
-
+upload_executor = ThreadPoolExecutor(max_workers=1)
+# stage blocks in parallel so larger data files upload concurrently
+upload_future = upload_executor.submit(
+    file_client.upload_data, tables_json_bytes, overwrite=True, max_concurrency=8, chunk_size=4*1024*1024
+)
 
-fabric_headers = get_fabric_headers()
 
-# create sql db
-sqldb_data = {
-  "displayName": sqldb_name,
-  "description": "SQL Database"
-}
-sqldb_res = requests.post(fabric_sql_url, headers=fabric_headers, json=sqldb_data)
-if sqldb_res.status_code == 202:
-    print("sql database creation accepted with status 202")
-    
-    # print(sqldb_res.headers)
-    retry_url = sqldb_res.headers.get("Location")
-
-    # wait_seconds = 10
-    wait_seconds = int(sqldb_res.headers.get("Retry-After"))
-    attempt = 1
-    status = 'Running'
-    while status == 'Running':
-        print(f"Polling attempt {attempt}...")
-        time.sleep(wait_seconds)
-        retry_response = requests.get(retry_url, headers=fabric_headers)
-        # wait_seconds = int(retry_response.headers.get("Retry-After"))
-        status = retry_response.json()['status']
-        attempt += 1
-
-    print('sql database created',retry_response.json()['status'])
-
-elif sqldb_res.status_code == 200:
-    print('sql database created')
-else:
-    print(f"sql database creation failed with status: {sqldb_res.status_code}")
-    print(sqldb_res.text)
+sqldb = sqldb_future.result()
 
 fabric_headers = get_fabric_headers()
-# get SQL DBs list
-sqldb_res = requests.get(fabric_sql_url, headers=fabric_headers)
-sqlsdbs_res = sqldb_res.json()
-# print(sqlsdbs_res)
-
-for sqldb in sqlsdbs_res['value']:
-    if sqldb['displayName'] == sqldb_name:
-        sqldb_id = sqldb['id']
-        FABRIC_SQL_DATABASE = '{' + sqldb['properties']['databaseName'] + '}'
-        FABRIC_SQL_SERVER = sqldb['properties']['serverFqdn'].replace(',1433','')
-        odbc_driver = "{ODBC Driver 17 for SQL Server}"
-        # FABRIC_SQL_CONNECTION_STRING = f"DRIVER={odbc_driver};SERVER={FABRIC_SQL_SERVER};DATABASE={FABRIC_SQL_DATABASE};UID={backend_app_uid};Authentication=ActiveDirectoryMSI"
+if sqldb is None:
+    # creation failed, e.g. because the database already exists; look it up by name
+    sqlsdbs_res = session.get(fabric_sql_url, headers=fabric_headers).json()
+    sqldb = next((db for db in sqlsdbs_res['value'] if db['displayName'] == sqldb_name), None)
+    if sqldb is None:
+        raise RuntimeError(f"SQL database {sqldb_name} was not created and is not listed in workspace {workspaceId}")
+if 'properties' not in sqldb:
+    # the create result may not carry the connection details yet; fetch just this database
+    sqldb = session.get(fabric_sql_url + sqldb['id'], headers=fabric_headers).json()
+if 'properties' not in sqldb:
+    raise RuntimeError(f"SQL database {sqldb_name} has no connection properties yet; it is not ready")
+
+sqldb_id = sqldb['id']
+FABRIC_SQL_DATABASE = '{' + sqldb['properties']['databaseName'] + '}'
+FABRIC_SQL_SERVER = sqldb['properties']['serverFqdn'].replace(',1433','')
 print(sqldb_id)
 
 
 
 # create tables and upload data
-from azure.identity import AzureCliCredential
 import pyodbc
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'fabric_scripts')))
+from sql_batches import load_batches, execute_batches
 import struct
+import atexit
+
+# Connection pooling must be enabled before the first connection is opened
+pyodbc.pooling = True
+SQL_COPT_SS_ACCESS_TOKEN = 1256
+# Use ODBC Driver 18 when it is installed and fall back to the legacy Driver 17 otherwise
+sql_odbc_driver = "{ODBC Driver 18 for SQL Server}" if "ODBC Driver 18 for SQL Server" in pyodbc.drivers() else "{ODBC Driver 17 for SQL Server}"
+fabric_db_conn = None
 
 def get_fabric_db_connection():
+    # The connection is opened once and shared by every caller for the rest of the run
+    global fabric_db_conn
+    if fabric_db_conn is not None:
+        return fabric_db_conn
+
     server = FABRIC_SQL_SERVER
     database = FABRIC_SQL_DATABASE
-    driver = "{ODBC Driver 17 for SQL Server}"
-    
+    # 32 KB packets (vs the 4 KB default) cut the round trips needed for the bulk inserts
+    connection_options = "Encrypt=yes;TrustServerCertificate=no;Packet Size=32767;Connection Timeout=30;"
+
     try:
-        conn=None
-        connection_string = ""
- 
-        with AzureCliCredential() as credential:
-            token = credential.get_token("https://database.windows.net/.default")
-            # logging.info("FABRIC-SQL-TOKEN: %s" % token.token)
-            token_bytes = token.token.encode("utf-16-LE")
-            token_struct = struct.pack(
-                f"<I{len(token_bytes)}s",
-                len(token_bytes),
-                token_bytes
-            )
-
-            SQL_COPT_SS_ACCESS_TOKEN = 1256
-            connection_string = f"DRIVER={driver};SERVER={server};DATABASE={database};"  
-            conn = pyodbc.connect( connection_string, attrs_before={SQL_COPT_SS_ACCESS_TOKEN: token_struct})      
-            print('connected to fabric sql db')        
- 
-        return conn
+        token = get_token("https://database.windows.net/.default")
+        # logging.info("FABRIC-SQL-TOKEN: %s" % token.token)
+        token_bytes = token.token.encode("utf-16-LE")
+        token_struct = struct.pack(
+            f"<I{len(token_bytes)}s",
+            len(token_bytes),
+            token_bytes
+        )
+
+        connection_string = f"DRIVER={sql_odbc_driver};SERVER={server};DATABASE={database};{connection_options}"
+        fabric_db_conn = pyodbc.connect( connection_string, attrs_before={SQL_COPT_SS_ACCESS_TOKEN: token_struct})
+        print('connected to fabric sql db')
+
+        return fabric_db_conn
     except :
         print("Failed to connect to Fabric SQL Database")
         pass
 
+@atexit.register
+def close_fabric_db_connection():
+    global fabric_db_conn
+    if fabric_db_conn is not None:
+        fabric_db_conn.close()
+        fabric_db_conn = None
+
 conn = get_fabric_db_connection()
-cursor = conn.cursor()
-print(cursor)
 sql_filename = '../fabric_scripts/sql_files/data_sql.sql'
-with open(sql_filename, 'r', encoding='utf-8') as f:
-    sql_script = f.read()
-    cursor.execute(sql_script)
-cursor.commit()
-conn.close()
+# DDL runs statement by statement and the INSERT rows are bound with fast_executemany;
+# the parsed batches are reused from the previous run while data_sql.sql is unchanged
+execute_batches(conn, load_batches(sql_filename))
+close_fabric_db_connection()
 
-import json
+def sql_tables_in_onelake():
+    # the shortcuts target the SQL database tables mirrored to OneLake
+    return all(
+        file_system_client.get_directory_client(f"{sqldb_name}.SQLDatabase/Tables/dbo/{table['tablename']}").exists()
+        for table in data['tables']
+    )
 
+# wait (up to the previous fixed 60 seconds) for the new tables to be mirrored to OneLake
+poll_until(sql_tables_in_onelake, bool, max_wait=30, deadline=60)
 
-file_path = "../fabric_scripts/sql_files/tables.json"
+fabric_shortcuts_url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/items/{lakehouseId}/shortcuts?shortcutConflictPolicy=CreateOrOverwrite"
 
-time.sleep(60)
-with open(file_path, "r", encoding="utf-8") as f:
-    data = json.load(f)
 
-for table in data['tables']:
+def create_shortcut(table, max_attempts=5):
     # # create shortcut for lakehouse
-    try: 
-        fabric_shortcuts_url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/items/{lakehouseId}/shortcuts?shortcutConflictPolicy=CreateOrOverwrite"
-        shortcut_lh ={
-            "path": "/Tables",
-            "name": table['tablename'],
-            "target": {
-                "oneLake": {
-                    "workspaceId": workspaceId,
-                    "itemId": sqldb_id,
-                    "path": f"Tables/dbo/{table['tablename']}"
-                }
-            }
-        }
-        shortcut_res = requests.post(fabric_shortcuts_url, headers=fabric_headers, json=shortcut_lh)
-        print('shortcut: ',shortcut_res.json())
-    except: 
-        time.sleep(30)
-        fabric_shortcuts_url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/items/{lakehouseId}/shortcuts?shortcutConflictPolicy=CreateOrOverwrite"
-        shortcut_lh ={
-            "path": "/Tables",
-            "name": table['tablename'],
-            "target": {
-                "oneLake": {
-                    "workspaceId": workspaceId,
-                    "itemId": sqldb_id,
-                    "path": f"Tables/dbo/{table['tablename']}"
-                }
+    shortcut_lh ={
+        "path": "/Tables",
+        "name": table['tablename'],
+        "target": {
+            "oneLake": {
+                "workspaceId": workspaceId,
+                "itemId": sqldb_id,
+                "path": f"Tables/dbo/{table['tablename']}"
             }
         }
-        shortcut_res = requests.post(fabric_shortcuts_url, headers=fabric_headers, json=shortcut_lh)
-        print('shortcut: ',shortcut_res.json())
+    }
+    for attempt in range(max_attempts):
+        try:
+            shortcut_res = session.post(fabric_shortcuts_url, headers=fabric_headers, json=shortcut_lh)
+            print('shortcut: ',shortcut_res.json())
+            return table, shortcut_res
+        except Exception:
+            if attempt == max_attempts - 1:
+                raise
+            # back off 2, 4, 8, 16 seconds between attempts
+            time.sleep(2 ** (attempt + 1))
 
 
-while env_details_json['properties']['publishDetails']['state'] == 'Running':
-    print('publishing is running')
-    time.sleep(120)
-    env_details_json = requests.get(env_details_url, headers=fabric_headers).json()
-    print(env_details_json)
+# shortcuts are independent of each other, so create them concurrently
+with ThreadPoolExecutor(max_workers=16) as shortcut_executor:
+    shortcut_results = list(shortcut_executor.map(create_shortcut, data['tables']))
+
+
+environmentId, env_details_json = env_future.result()
+executor.shutdown()
 
 print(env_details_json)
 
 # create notebook item
 notebook_names = ['create_data_agent']
 
-for notebook_name in notebook_names:
-    with open('notebooks/'+ notebook_name +'.ipynb', 'r') as f:
-        notebook_json = json.load(f)
+def create_notebook(notebook_name):
+    with open('notebooks/'+ notebook_name +'.ipynb', 'rb') as f:
+        notebook_json = json_loads(f.read())
 
     print("lakehouse_res")
     print(lakehouse_res)
-    print(lakehouse_res.json())
+    print(lh)
     
-    try:
-        notebook_json['metadata']['dependencies']['lakehouse']['default_lakehouse'] = lakehouse_res.json()['id']
-        notebook_json['metadata']['dependencies']['lakehouse']['default_lakehouse_name'] = lakehouse_res.json()['displayName']
-        notebook_json['metadata']['dependencies']['lakehouse']['default_lakehouse_workspace_id'] = lakehouse_res.json()['workspaceId']
-        print('lakehouse name: ', notebook_json['metadata']['dependencies']['lakehouse']['default_lakehouse_name'] )
-    except:
-        pass
+    # point the notebook at this deployment's lakehouse and environment
+    dependencies = notebook_json.setdefault('metadata', {}).setdefault('dependencies', {})
+    dependencies.setdefault('lakehouse', {}).update({
+        'default_lakehouse': lh['id'],
+        'default_lakehouse_name': lh['displayName'],
+        'default_lakehouse_workspace_id': lh['workspaceId'],
+    })
+    print('lakehouse name: ', lh['displayName'])
     
     if environmentId != '':
-        try:
-            notebook_json['metadata']['dependencies']['environment']['environmentId'] = environmentId
-            notebook_json['metadata']['dependencies']['environment']['workspaceId'] = lakehouse_res.json()['workspaceId']
-        except:
-            pass
+        dependencies.setdefault('environment', {}).update({
+            'environmentId': environmentId,
+            'workspaceId': lh['workspaceId'],
+        })
 
 
-    notebook_base64 = base64.b64encode(json.dumps(notebook_json).encode('utf-8'))
+    notebook_base64 = payload_base64(notebook_json)
     
     notebook_data = {
         "displayName":notebook_name,
@@ -290,111 +429,48 @@ for notebook_name in notebook_names:
             "parts": [
                 {
                     "path": "notebook-content.ipynb",
-                    "payload": notebook_base64.decode('utf-8'),
+                    "payload": notebook_base64,
                     "payloadType": "InlineBase64"
                 }
             ]
         }
     }
     
-    fabric_response = requests.post(fabric_items_url, headers=fabric_headers, json=notebook_data)
-    
-time.sleep(120)
+    return session.post(fabric_items_url, headers=fabric_headers, json=notebook_data)
+
+# each notebook is read, patched, encoded and posted independently, so they are created concurrently
+with ThreadPoolExecutor(max_workers=min(8, len(notebook_names))) as notebook_executor:
+    notebook_responses = list(notebook_executor.map(create_notebook, notebook_names))
+
 fabric_notebooks_url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/notebooks"
-notebooks_res = requests.get(fabric_notebooks_url, headers=fabric_headers)
-notebooks_res.json()
-
-
-pipeline_notebook_id = ''
-print("notebook_res.json.values: ", notebooks_res.json().values())
-for n in notebooks_res.json().values():
-    for notebook in n:
-        # print("notebook displayname", notebook['displayName'])
-        # if notebook['displayName'] == pipeline_notebook_name:
-        pipeline_notebook_id = notebook['id']
-        #     break
+# wait (up to the previous fixed 120 seconds) for the created notebooks to be listed
+notebooks_res = poll_until(
+    lambda: session.get(fabric_notebooks_url, headers=fabric_headers),
+    lambda r: set(notebook_names) <= {notebook['displayName'] for notebook in json_loads(r.content).get('value', [])},
+    deadline=120,
+)
+
+
+# the pipeline runs the data agent notebook; look it up by name rather than taking the last one listed
+pipeline_notebook_name = 'create_data_agent'
+notebook_ids = {notebook['displayName']: notebook['id'] for notebook in json_loads(notebooks_res.content).get('value', [])}
+print("notebooks: ", notebook_ids)
+pipeline_notebook_id = notebook_ids.get(pipeline_notebook_name, '')
 print("pipeline_notebook_id: ", pipeline_notebook_id)
 
 
 pipeline_name = 'notebook_pipeline' + solutionname
-# create pipeline item
-pipeline_json = {
-    "name": pipeline_name,
-    "properties": {
-        "activities": [
-            {
-                "name": "create_dataagent",
-                "type": "TridentNotebook",
-                "dependsOn": [],
-                "policy": {
-                    "timeout": "0.12:00:00",
-                    "retry": 0,
-                    "retryIntervalInSeconds": 30,
-                    "secureOutput": "false",
-                    "secureInput": "false"
-                },
-                "typeProperties": {
-                    "notebookId": pipeline_notebook_id,
-                    "workspaceId": workspaceId
-                }
-            }
-        ]
-    }
-}
-
-
-pipeline_json = {
-    "name": pipeline_name,
-    "properties": {
-        "activities": [
-            {
-                "name": "create_dataagent",
-                "type": "TridentNotebook",
-                "dependsOn": [],
-                "policy": {
-                    "timeout": "0.12:00:00",
-                    "retry": 0,
-                    "retryIntervalInSeconds": 30,
-                    "secureOutput": "false",
-                    "secureInput": "false"
-                },
-                "typeProperties": {
-                    "notebookId": pipeline_notebook_id,
-                    "workspaceId": workspaceId,
-                    "parameters": {
-                        "data_agent_name": {
-                            "value": {
-                                "value": "@pipeline().parameters.data_agent_name",
-                                "type": "Expression"
-                            },
-                            "type": "string"
-                        },
-                        "lakehouse_name": {
-                            "value": {
-                                "value": "@pipeline().parameters.lakehouse_name",
-                                "type": "Expression"
-                            },
-                            "type": "string"
-                        }
-                    }
-                }
-            }
-        ],
-        "parameters": {
-            "data_agent_name": {
-                "type": "string",
-                "defaultValue": "my_data_agent"
-            },
-            "lakehouse_name": {
-                "type": "string", 
-                "defaultValue": lakehouse_name
-            }
-        },
-    }
-}
+# create pipeline item from the static template, filling in the names and ids of this deployment
+with open('pipeline_template.json', 'rb') as f:
+    pipeline_json = json_loads(f.read())
+pipeline_json['name'] = pipeline_name
+notebook_activity = pipeline_json['properties']['activities'][0]['typeProperties']
+notebook_activity['notebookId'] = pipeline_notebook_id
+notebook_activity['workspaceId'] = workspaceId
+pipeline_json['properties']['parameters']['lakehouse_name']['defaultValue'] = lakehouse_name
 
 
-pipeline_base64 = base64.b64encode(json.dumps(pipeline_json).encode('utf-8'))
+pipeline_base64 = payload_base64(pipeline_json)
 
 pipeline_data = {
         "displayName":pipeline_name,
@@ -404,22 +480,27 @@ pipeline_data = {
             "parts": [
                 {
                     "path": "pipeline-content.json",
-                    "payload": pipeline_base64.decode('utf-8'),
+                    "payload": pipeline_base64,
                     "payloadType": "InlineBase64"
                 }
             ]
         }
     }
 
-pipeline_response = requests.post(fabric_items_url, headers=fabric_headers, json=pipeline_data)
+pipeline_response = session.post(fabric_items_url, headers=fabric_headers, json=pipeline_data)
 pipeline_response.json()
 pipeline_nb_id = pipeline_response.json()['id']
 print('pipeline for notebook id: ', pipeline_nb_id)
 
+# the pipeline's notebook reads Files/data/tables.json from the lakehouse, so the
+# background upload has to have landed before the run starts
+upload_future.result()
+upload_executor.shutdown()
+
 # run the pipeline once
 job_url = fabric_base_url + f"items/{pipeline_nb_id}/jobs/instances?jobType=Pipeline"
 # f"items/{pipeline_id}/jobs/instances?jobType=Pipeline"
-job_response = requests.post(job_url, headers=fabric_headers)
+job_response = session.post(job_url, headers=fabric_headers)
 
 
 print(job_response)
@@ -429,21 +510,19 @@ if job_response.status_code == 202:
     
     retry_url = job_response.headers.get("Location")
 
-    # wait_seconds = 20
-    wait_seconds = int(job_response.headers.get("Retry-After"))
-    attempt = 1
-    status = ''
-    while (status != 'Completed') and (status != 'Failed'):
-        print(f"Polling attempt {attempt}...")
-        time.sleep(wait_seconds)
-        retry_response = requests.get(retry_url, headers=fabric_headers)
+    def get_job_status():
+        print("Polling pipeline run...")
+        retry_response = session.get(retry_url, headers=fabric_headers)
         print(retry_response.json())
-        # wait_seconds = int(retry_response.headers.get("Retry-After"))
-        status = retry_response.json()['status']
-        print(status)
-        attempt += 1
-        # if attempt % 2 == 0:
-        #     fabric_headers = get_fabric_headers()
+        print(retry_response.json()['status'])
+        return retry_response
+
+    retry_response = poll_until(
+        get_job_status,
+        lambda r: json_loads(r.content)['status'] in ('Completed', 'Failed'),
+        max_wait=int(job_response.headers.get("Retry-After")),
+        deadline=None,
+    )
 
     print('pipeline run completed',retry_response.json()['status'])
 
@@ -454,11 +533,15 @@ else:
     print('pipeline job response: ',job_response.text)
 
 
-# get all items
-items_res = requests.get(fabric_items_url, headers=fabric_headers)
-print(items_res.json())
-artifact_id = ''
-for item in items_res.json()['value']:
-    if item['displayName'] == 'my_data_agent':
-        artifact_id = item['id']
-        print('data agent id: ', artifact_id) 
\ No newline at end of file
+# look up the data agent created by the pipeline, listing only data agent items
+def get_item_ids(params=None):
+    items_res = session.get(fabric_items_url, headers=fabric_headers, params=params)
+    return {item['displayName']: item['id'] for item in json_loads(items_res.content).get('value', [])}
+
+item_ids = get_item_ids({'type': 'DataAgent'})
+if 'my_data_agent' not in item_ids:
+    # fall back to the unfiltered listing in case the item type is reported differently
+    item_ids = get_item_ids()
+print(item_ids)
+artifact_id = item_ids.get('my_data_agent', '')
+print('data agent id: ', artifact_id) 
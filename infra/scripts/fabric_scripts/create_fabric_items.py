@@ -1,6 +1,10 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from azure.identity import AzureCliCredential
 import shlex
 import argparse
@@ -18,15 +22,49 @@ solutionname = args.solutionname
 backend_app_pid = args.backend_app_pid
 backend_app_uid = args.backend_app_uid
 
+# A single Azure CLI credential is shared by all calls; tokens are cached per scope and
+# only refreshed when they are within 5 minutes of expiry.
+credential = AzureCliCredential()
+token_cache = {}
+token_lock = threading.Lock()
+
+def get_token(scope):
+    with token_lock:
+        token = token_cache.get(scope)
+        if token is None or token.expires_on - time.time() < 300:
+            token = token_cache[scope] = credential.get_token(scope)
+    return token
+
 def get_fabric_headers():
-    credential = AzureCliCredential()
-    cred = credential.get_token('https://api.fabric.microsoft.com/.default')
-    token = cred.token
+    token = get_token('https://api.fabric.microsoft.com/.default').token
     fabric_headers = {"Authorization": "Bearer " + token.strip()}
     return(fabric_headers)
 
+# Reuse pooled keep-alive connections to the Fabric API across all calls; idempotent
+# requests are retried on throttling and transient server errors, honoring Retry-After.
+session = requests.Session()
+session.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=5, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False),
+))
+
 fabric_headers = get_fabric_headers()
 
+
+def poll_until(fetch, is_done, initial=2, max_wait=60, deadline=600):
+    # Calls fetch() until is_done(result) holds, backing off initial, 2 * initial, ... seconds
+    # (capped at max_wait) between attempts. Gives up after deadline seconds (None waits
+    # indefinitely) and returns the last result either way.
+    wait_seconds = initial
+    give_up_at = None if deadline is None else time.monotonic() + deadline
+    while True:
+        result = fetch()
+        if is_done(result) or (give_up_at is not None and time.monotonic() >= give_up_at):
+            return result
+        time.sleep(min(wait_seconds, max_wait))
+        wait_seconds *= 2
+
 lakehouse_name = 'retail_lakehouse_' + solutionname
 sqldb_name = 'retail_sqldatabase_' + solutionname
 pipeline_name = 'data_pipeline_' + solutionname
@@ -39,12 +77,60 @@ fabric_sql_url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/
 
 fabric_create_workspace_url = f"https://api.fabric.microsoft.com/v1/workspaces"
 
+def create_sql_database():
+    # create sql db
+    sqldb_data = {
+      "displayName": sqldb_name,
+      "description": "SQL Database"
+    }
+    sqldb_res = session.post(fabric_sql_url, headers=fabric_headers, json=sqldb_data)
+    if sqldb_res.status_code == 202:
+        print("sql database creation accepted with status 202")
+
+        # print(sqldb_res.headers)
+        retry_url = sqldb_res.headers.get("Location")
+
+        def get_sqldb_status():
+            print("Polling sql database creation...")
+            return session.get(retry_url, headers=fabric_headers)
+
+        # the operation is not reported before Retry-After, and only Succeeded/Failed are
+        # final: it can still be NotStarted when polling begins
+        retry_after = int(sqldb_res.headers.get("Retry-After"))
+        time.sleep(retry_after)
+        retry_response = poll_until(
+            get_sqldb_status,
+            lambda r: r.json()['status'] in ('Succeeded', 'Failed'),
+            max_wait=retry_after,
+            deadline=None,
+        )
+
+        print('sql database created',retry_response.json()['status'])
+        if retry_response.json()['status'] == 'Succeeded':
+            # the created item is served from the operation's result URL
+            result_url = retry_response.headers.get("Location") or retry_url.rstrip('/') + '/result'
+            return session.get(result_url, headers=fabric_headers).json()
+
+    elif sqldb_res.status_code in (200, 201):
+        print('sql database created')
+        return sqldb_res.json()
+    else:
+        print(f"sql database creation failed with status: {sqldb_res.status_code}")
+        print(sqldb_res.text)
+    return None
+
+
+# The SQL database LRO does not depend on the lakehouse, so it is started first and
+# polled in the background while the lakehouse is created and tables.json uploaded.
+executor = ThreadPoolExecutor(max_workers=1)
+sqldb_future = executor.submit(create_sql_database)
+
 # create lakehouse
 lakehouse_data = {
   "displayName": lakehouse_name,
   "type": "Lakehouse"
 }
-lakehouse_res = requests.post(fabric_items_url, headers=fabric_headers, json=lakehouse_data)
+lakehouse_res = session.post(fabric_items_url, headers=fabric_headers, json=lakehouse_data)
 # print(lakehouse_res.json())
 lakehouseId = lakehouse_res.json()['id']
 
@@ -53,8 +139,6 @@ lakehouseId = lakehouse_res.json()['id']
 from azure.storage.filedatalake import (
     DataLakeServiceClient
 )
-from azure.identity import AzureCliCredential
-credential = AzureCliCredential()
 
 account_name = "onelake" #always onelake
 data_path = f"{lakehouse_name}.Lakehouse/Files/"
@@ -64,7 +148,7 @@ account_url = f"https://{account_name}.dfs.fabric.microsoft.com"
 service_client = DataLakeServiceClient(account_url, credential=credential)
 
 # # get workspace name
-ws_res = requests.get(fabric_base_url, headers=fabric_headers)
+ws_res = session.get(fabric_base_url, headers=fabric_headers)
 # print(ws_res.json())
 workspace_name = ws_res.json()['displayName']
 
@@ -78,129 +162,108 @@ print('uploading files')
 file_client = directory_client.get_file_client("data/" + 'tables.json')
 with open(file='infra/scripts/fabric_scripts/sql_files/tables.json', mode="rb") as data:
         # print('data', data)
-    file_client.upload_data(data, overwrite=True)
+    # stage blocks in parallel so larger data files upload concurrently
+    file_client.upload_data(data, overwrite=True, max_concurrency=8, chunk_size=4*1024*1024)
 
 
-fabric_headers = get_fabric_headers()
-
-# create sql db
-sqldb_data = {
-  "displayName": sqldb_name,
-  "description": "SQL Database"
-}
-sqldb_res = requests.post(fabric_sql_url, headers=fabric_headers, json=sqldb_data)
-if sqldb_res.status_code == 202:
-    print("sql database creation accepted with status 202")
-    
-    # print(sqldb_res.headers)
-    retry_url = sqldb_res.headers.get("Location")
-
-    # wait_seconds = 10
-    wait_seconds = int(sqldb_res.headers.get("Retry-After"))
-    attempt = 1
-    status = 'Running'
-    while status == 'Running':
-        print(f"Polling attempt {attempt}...")
-        time.sleep(wait_seconds)
-        retry_response = requests.get(retry_url, headers=fabric_headers)
-        # wait_seconds = int(retry_response.headers.get("Retry-After"))
-        status = retry_response.json()['status']
-        attempt += 1
-
-    print('sql database created',retry_response.json()['status'])
-
-elif sqldb_res.status_code == 200:
-    print('sql database created')
-else:
-    print(f"sql database creation failed with status: {sqldb_res.status_code}")
-    print(sqldb_res.text)
+# wait for the SQL database provisioning started before the upload
+sqldb = sqldb_future.result()
+executor.shutdown()
 
 fabric_headers = get_fabric_headers()
-# get SQL DBs list
-sqldb_res = requests.get(fabric_sql_url, headers=fabric_headers)
-sqlsdbs_res = sqldb_res.json()
-# print(sqlsdbs_res)
-
-try: 
-    for sqldb in sqlsdbs_res['value']:
-        if sqldb['displayName'] == sqldb_name:
-            sqldb_id = sqldb['id']
-            FABRIC_SQL_DATABASE = '{' + sqldb['properties']['databaseName'] + '}'
-            FABRIC_SQL_SERVER = sqldb['properties']['serverFqdn'].replace(',1433','')
-            odbc_driver = "{ODBC Driver 18 for SQL Server}"
-            FABRIC_SQL_CONNECTION_STRING = f"DRIVER={odbc_driver};SERVER={FABRIC_SQL_SERVER};DATABASE={FABRIC_SQL_DATABASE};UID={backend_app_uid};Authentication=ActiveDirectoryMSI"
-    # print(sqldb_id)
-except: 
-    for sqldb in sqlsdbs_res['value']:
-        if sqldb['displayName'] == sqldb_name:
-            sqldb_id = sqldb['id']
-            FABRIC_SQL_DATABASE = '{' + sqldb['properties']['databaseName'] + '}'
-            FABRIC_SQL_SERVER = sqldb['properties']['serverFqdn'].replace(',1433','')
-            odbc_driver = "{ODBC Driver 17 for SQL Server}"
-            FABRIC_SQL_CONNECTION_STRING = f"DRIVER={odbc_driver};SERVER={FABRIC_SQL_SERVER};DATABASE={FABRIC_SQL_DATABASE};UID={backend_app_uid};Authentication=ActiveDirectoryMSI"
-    # print(sqldb_id)
-
+if sqldb is None:
+    # creation failed, e.g. because the database already exists; look it up by name
+    sqlsdbs_res = session.get(fabric_sql_url, headers=fabric_headers).json()
+    sqldb = next((db for db in sqlsdbs_res['value'] if db['displayName'] == sqldb_name), None)
+    if sqldb is None:
+        raise RuntimeError(f"SQL database {sqldb_name} was not created and is not listed in workspace {workspaceId}")
+if 'properties' not in sqldb:
+    # the create result may not carry the connection details yet; fetch just this database
+    sqldb = session.get(fabric_sql_url + sqldb['id'], headers=fabric_headers).json()
+if 'properties' not in sqldb:
+    raise RuntimeError(f"SQL database {sqldb_name} has no connection properties yet; it is not ready")
+
+sqldb_id = sqldb['id']
+FABRIC_SQL_DATABASE = '{' + sqldb['properties']['databaseName'] + '}'
+FABRIC_SQL_SERVER = sqldb['properties']['serverFqdn'].replace(',1433','')
 
 
 # create tables and upload data
-from azure.identity import AzureCliCredential
 import pyodbc
+from sql_batches import load_batches, execute_batches
 import struct
+import atexit
+
+# Connection pooling must be enabled before the first connection is opened
+pyodbc.pooling = True
+SQL_COPT_SS_ACCESS_TOKEN = 1256
+# Use ODBC Driver 18 when it is installed and fall back to the legacy Driver 17 otherwise
+sql_odbc_driver = "{ODBC Driver 18 for SQL Server}" if "ODBC Driver 18 for SQL Server" in pyodbc.drivers() else "{ODBC Driver 17 for SQL Server}"
+fabric_db_conn = None
 
 def get_fabric_db_connection():
+    # The connection is opened once and shared by every caller for the rest of the run
+    global fabric_db_conn
+    if fabric_db_conn is not None:
+        return fabric_db_conn
+
     server = FABRIC_SQL_SERVER
     database = FABRIC_SQL_DATABASE
-    driver = "{ODBC Driver 18 for SQL Server}"
-    
+    # 32 KB packets (vs the 4 KB default) cut the round trips needed for the bulk inserts
+    connection_options = "Encrypt=yes;TrustServerCertificate=no;Packet Size=32767;Connection Timeout=30;"
+
     try:
-        conn=None
-        connection_string = ""
- 
-        with AzureCliCredential() as credential:
-            token = credential.get_token("https://database.windows.net/.default")
-            # logging.info("FABRIC-SQL-TOKEN: %s" % token.token)
-            token_bytes = token.token.encode("utf-16-LE")
-            token_struct = struct.pack(
-                f"<I{len(token_bytes)}s",
-                len(token_bytes),
-                token_bytes
-            )
-
-            try: 
-                SQL_COPT_SS_ACCESS_TOKEN = 1256
-                connection_string = f"DRIVER={driver};SERVER={server};DATABASE={database};"  
-                conn = pyodbc.connect( connection_string, attrs_before={SQL_COPT_SS_ACCESS_TOKEN: token_struct})      
-                print('connected to fabric sql db')        
-            except:
-                SQL_COPT_SS_ACCESS_TOKEN = 1256
-                driver = "{ODBC Driver 17 for SQL Server}"
-                connection_string = f"DRIVER={driver};SERVER={server};DATABASE={database};Encrypt=yes;TrustServerCertificate=no;Connection Timeout=30;"  
-                conn = pyodbc.connect( connection_string, attrs_before={SQL_COPT_SS_ACCESS_TOKEN: token_struct})      
-                print('connected to fabric sql db')     
- 
-        return conn
+        token = get_token("https://database.windows.net/.default")
+        # logging.info("FABRIC-SQL-TOKEN: %s" % token.token)
+        token_bytes = token.token.encode("utf-16-LE")
+        token_struct = struct.pack(
+            f"<I{len(token_bytes)}s",
+            len(token_bytes),
+            token_bytes
+        )
+
+        connection_string = f"DRIVER={sql_odbc_driver};SERVER={server};DATABASE={database};{connection_options}"
+        fabric_db_conn = pyodbc.connect( connection_string, attrs_before={SQL_COPT_SS_ACCESS_TOKEN: token_struct})
+        print('connected to fabric sql db')
+
+        return fabric_db_conn
     except :
         print("Failed to connect to Fabric SQL Database")
         pass
 
+@atexit.register
+def close_fabric_db_connection():
+    global fabric_db_conn
+    if fabric_db_conn is not None:
+        fabric_db_conn.close()
+        fabric_db_conn = None
+
 conn = get_fabric_db_connection()
-cursor = conn.cursor()
-print(cursor)
 sql_filename = 'infra/scripts/fabric_scripts/sql_files/data_sql.sql'
-with open(sql_filename, 'r', encoding='utf-8') as f:
-    sql_script = f.read()
-    cursor.execute(sql_script)
-cursor.commit()
+# DDL runs statement by statement and the INSERT rows are bound with fast_executemany;
+# the parsed batches are reused from the previous run while data_sql.sql is unchanged
+execute_batches(conn, load_batches(sql_filename))
+cursor = conn.cursor()
 
 
 import json
 
 file_path = "infra/scripts/fabric_scripts/sql_files/tables.json"
 
-time.sleep(120)
 with open(file_path, "r", encoding="utf-8") as f:
     data = json.load(f)
 
+
+def sql_tables_in_onelake():
+    # the shortcuts target the SQL database tables mirrored to OneLake
+    return all(
+        file_system_client.get_directory_client(f"{sqldb_name}.SQLDatabase/Tables/dbo/{table['tablename']}").exists()
+        for table in data['tables']
+    )
+
+# wait (up to the previous fixed 120 seconds) for the new tables to be mirrored to OneLake
+poll_until(sql_tables_in_onelake, bool, max_wait=30, deadline=120)
+
 for table in data['tables']:
     # # create shortcut for lakehouse 
     fabric_shortcuts_url = f"https://api.fabric.microsoft.com/v1/workspaces/{workspaceId}/items/{lakehouseId}/shortcuts?shortcutConflictPolicy=CreateOrOverwrite"
@@ -215,7 +278,7 @@ for table in data['tables']:
             }
         }
     }
-    shortcut_res = requests.post(fabric_shortcuts_url, headers=fabric_headers, json=shortcut_lh)
+    shortcut_res = session.post(fabric_shortcuts_url, headers=fabric_headers, json=shortcut_lh)
     # print('shortcut: ',shortcut_res.json())
 
 from datetime import datetime, timedelta
@@ -236,7 +299,7 @@ conn.commit()
 print("Dates adjusted to current date.")
 
 cursor.close()
-conn.close()
+close_fabric_db_connection()
 # fabric_headers = get_fabric_headers()
 
 # # get connection Id
@@ -383,7 +446,7 @@ roleassignment_json ={
   },
   "role": "Contributor"
 }
-roleassignment_res = requests.post(fabric_ra_url, headers=fabric_headers, json=roleassignment_json)
+roleassignment_res = session.post(fabric_ra_url, headers=fabric_headers, json=roleassignment_json)
 
 odbc_driver_18 = "{ODBC Driver 18 for SQL Server}"
 FABRIC_SQL_CONNECTION_STRING_18 = f"DRIVER={odbc_driver_18};SERVER={FABRIC_SQL_SERVER};DATABASE={FABRIC_SQL_DATABASE};UID={backend_app_uid};Authentication=ActiveDirectoryMSI"
@@ -0,0 +1,194 @@
+"""
+Splits the sample data .sql script into batches that can be sent to the Fabric SQL
+database efficiently.
+
+DDL statements are executed one by one, while consecutive multi-row
+INSERT INTO ... VALUES (...), (...) statements for the same table are turned into a single
+parameterized INSERT executed with pyodbc's fast_executemany, so the rows are bound and
+sent in bulk instead of having the server parse one large literal script.
+
+The parsed batches are cached in a pickle next to the script, keyed by the SHA-256 of the
+.sql file, so later runs skip the parse while the file is unchanged.
+"""
+import decimal
+import hashlib
+import os
+import pickle
+import re
+
+# Statements in data_sql.sql are not consistently terminated with ';', so a new statement
+# also starts at any line beginning with one of these keywords. String literals are
+# matched as whole tokens so that ';' or keywords inside values are never split on.
+STATEMENT_BOUNDARY_PATTERN = re.compile(
+    r"'[^']*(?:''[^']*)*'|;|^[ \t]*(?=(?:DROP|CREATE|INSERT|ALTER|GO)\b)",
+    re.IGNORECASE | re.MULTILINE,
+)
+INSERT_PATTERN = re.compile(
+    r"INSERT\s+INTO\s+(?P<table>\S+)\s*\((?P<columns>[^)]*)\)\s*VALUES\s*(?P<rows>.*)",
+    re.IGNORECASE | re.DOTALL,
+)
+# Bumped whenever the shape of the parsed batches changes, so stale pickles are not reused
+BATCHES_FORMAT_VERSION = 2
+VALUE_PATTERN = re.compile(r"\s*(?:'(?P<string>(?:[^']|'')*)'|(?P<null>NULL)\b|(?P<number>[-+]?\d+(?:\.\d+)?))\s*", re.IGNORECASE)
+
+
+def split_statements(sql_script):
+    """
+    Splits a SQL script into individual statements.
+
+    Args:
+        sql_script (str): The script text.
+
+    Returns:
+        list[str]: The non-empty statements, without trailing ';' and GO separators.
+    """
+    statements = []
+    start = 0
+    for match in STATEMENT_BOUNDARY_PATTERN.finditer(sql_script):
+        token = match.group()
+        if token.startswith("'"):
+            continue
+        statements.append(sql_script[start:match.start()])
+        start = match.end()
+    statements.append(sql_script[start:])
+
+    return [s.strip() for s in statements if s.strip() and s.strip().upper() != "GO"]
+
+
+def parse_rows(rows_text):
+    """
+    Parses the tuples of a VALUES clause made of string, number and NULL literals.
+
+    Args:
+        rows_text (str): The text following VALUES.
+
+    Returns:
+        list[tuple] | None: The row parameters, or None if the clause contains anything
+        other than plain literals (expressions, function calls, ...).
+    """
+    rows = []
+    pos = 0
+    length = len(rows_text)
+    while pos < length:
+        while pos < length and rows_text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= length:
+            break
+        if rows_text[pos] != "(":
+            return None
+        pos += 1
+        row = []
+        while True:
+            match = VALUE_PATTERN.match(rows_text, pos)
+            if match is None:
+                return None
+            if match.group("string") is not None:
+                row.append(match.group("string").replace("''", "'"))
+            elif match.group("null") is not None:
+                row.append(None)
+            else:
+                # Bind numbers as numbers: a str parameter is sent as text and fails to
+                # convert against INT/DECIMAL columns for values like '2.0'
+                number = match.group("number")
+                row.append(decimal.Decimal(number) if "." in number else int(number))
+            pos = match.end()
+            if pos < length and rows_text[pos] == ",":
+                pos += 1
+            elif pos < length and rows_text[pos] == ")":
+                pos += 1
+                break
+            else:
+                return None
+        rows.append(tuple(row))
+    return rows
+
+
+def split_sql(sql_script):
+    """
+    Groups a SQL script into executable batches.
+
+    Args:
+        sql_script (str): The script text.
+
+    Returns:
+        list[tuple]: ("execute", statement) for statements run as-is, and
+        ("executemany", insert_sql, params) for each run of INSERT statements that
+        target the same table and columns.
+    """
+    batches = []
+    for statement in split_statements(sql_script):
+        match = INSERT_PATTERN.match(statement)
+        params = parse_rows(match.group("rows")) if match else None
+        if not params:
+            batches.append(("execute", statement))
+            continue
+
+        columns = [c.strip() for c in match.group("columns").split(",")]
+        insert_sql = f"INSERT INTO {match.group('table')} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        if batches and batches[-1][0] == "executemany" and batches[-1][1] == insert_sql:
+            batches[-1][2].extend(params)
+        else:
+            batches.append(("executemany", insert_sql, params))
+    return batches
+
+
+def load_batches(sql_filename, cache_path=None):
+    """
+    Returns the batches for a .sql file, reusing the cached parse when the file is unchanged.
+
+    Args:
+        sql_filename (str): Path to the .sql script.
+        cache_path (str): Where to keep the parsed batches. Defaults to
+            "<sql_filename>.batches.pkl".
+
+    Returns:
+        list[tuple]: The batches, as returned by split_sql.
+    """
+    cache_path = cache_path or sql_filename + ".batches.pkl"
+    with open(sql_filename, "rb") as f:
+        sql_bytes = f.read()
+    fingerprint = f"{BATCHES_FORMAT_VERSION}:{hashlib.sha256(sql_bytes).hexdigest()}"
+
+    try:
+        with open(cache_path, "rb") as f:
+            cached_fingerprint, batches = pickle.load(f)
+        if cached_fingerprint == fingerprint:
+            return batches
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+
+    batches = split_sql(sql_bytes.decode("utf-8"))
+    try:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((fingerprint, batches), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # the cache is only an optimization; a read-only checkout still works
+        pass
+    return batches
+
+
+def execute_batches(conn, batches):
+    """
+    Runs the batches produced by split_sql in a single transaction.
+
+    Args:
+        conn (pyodbc.Connection): An open connection to the target database.
+        batches (list[tuple]): The batches returned by split_sql.
+    """
+    conn.autocommit = False
+    cursor = conn.cursor()
+    cursor.fast_executemany = True
+    try:
+        for batch in batches:
+            if batch[0] == "executemany":
+                cursor.executemany(batch[1], batch[2])
+            else:
+                cursor.execute(batch[1])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
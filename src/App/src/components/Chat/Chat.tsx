@@ -444,11 +444,23 @@ const Chat: React.FC<ChatProps> = ({
         let isChartResponseReceived = false;
         const reader = response.body.getReader();
         let runningText = "";
+        // Each frame carries only the new text of the reply, so the deltas are concatenated here
+        let streamedContent = "";
         let hasError = false;
+        // A frame, or a multi-byte character, can be split across reads: decode in streaming
+        // mode and only hand complete lines on, keeping the unfinished last line for the next read
+        const decoder = new TextDecoder("utf-8");
+        let pendingText = "";
         while (true) {
           const { done, value } = await reader.read();
-          if (done) break;
-          const text = new TextDecoder("utf-8").decode(value);
+          pendingText += decoder.decode(value, { stream: !done });
+          const lineEnd = done ? pendingText.length : pendingText.lastIndexOf("\n") + 1;
+          const text = pendingText.substring(0, lineEnd);
+          pendingText = pendingText.substring(lineEnd);
+          if (text === "") {
+            if (done) break;
+            continue;
+          }
           try {
             const textObj = JSON.parse(text);
             if (textObj?.object?.data) {
@@ -481,8 +493,10 @@ const Chat: React.FC<ChatProps> = ({
                     runningText = parsed?.error;
                   } else if (isChartQuery(userMessage) && !hasError) {
                     runningText = runningText + textValue;
+                    streamedContent += parsed?.choices?.[0]?.messages?.[0]?.content ?? "";
                   } else if (typeof parsed === "object" && !hasError) {
-                    const responseContent  = parsed?.choices?.[0]?.messages?.[0]?.content;
+                    streamedContent += parsed?.choices?.[0]?.messages?.[0]?.content ?? "";
+                    const responseContent = streamedContent;
                      
                     const answerKey = `"answer":`;
                     const answerStartIndex  = responseContent.indexOf(answerKey);
@@ -527,6 +541,7 @@ const Chat: React.FC<ChatProps> = ({
               break;
             }
           }
+          if (done) break;
         }
         // END OF STREAMING
         if (hasError) {
@@ -551,9 +566,9 @@ const Chat: React.FC<ChatProps> = ({
             parsedChartResponse= JSON.parse("{" + splitRunningText[splitRunningText.length - 1]);
             let chartResponse : any = {};
             try {
-              chartResponse = JSON.parse(parsedChartResponse?.choices[0]?.messages[0]?.content)
+              chartResponse = JSON.parse(streamedContent)
             } catch (e) {
-              chartResponse = parsedChartResponse?.choices[0]?.messages[0]?.content;
+              chartResponse = streamedContent;
             }
           
             if (typeof chartResponse === 'object' && 'answer' in chartResponse) {
@@ -634,9 +649,9 @@ const Chat: React.FC<ChatProps> = ({
               }
             } else if (
               parsedChartResponse?.error ||
-              parsedChartResponse?.choices[0]?.messages[0]?.content
+              streamedContent
             ) {
-              let content = parsedChartResponse?.choices[0]?.messages[0]?.content;
+              let content = streamedContent;
               let displayContent = content;
               try {
                 const parsed = typeof content === "string" ? JSON.parse(content) : content;
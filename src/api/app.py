@@ -10,45 +10,126 @@ and cleanup.
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
+from azure.monitor.opentelemetry import configure_azure_monitor
 from dotenv import load_dotenv
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import logging
+import queue
 import uvicorn
 import os
 
-from chat import router as chat_router
-from history import router as history_router
-from history_sql import router as history_sql_router
-from semantic_kernel.agents import AzureAIAgent, AzureAIAgentSettings
-from auth.azure_credential_utils import get_azure_credential_async
+# Load .env once, before the routers are imported: they read their configuration at import time
 load_dotenv()
 
+_monitoring_configured = False
+
+
+def configure_monitoring():
+    """
+    Configures logging and Application Insights for the whole app.
+
+    Runs once per process; the routers only create their module loggers, so importing them
+    does not install another set of exporters and log handlers.
+    """
+    global _monitoring_configured
+    if _monitoring_configured:
+        return
+    _monitoring_configured = True
+
+    logging.basicConfig(level=logging.INFO)
+
+    # Write console logs from a background thread: handlers on the root logger only enqueue
+    # the record, so logging never blocks the event loop on a stdout write
+    root_logger = logging.getLogger()
+    console_handlers = list(root_logger.handlers)
+    for handler in console_handlers:
+        root_logger.removeHandler(handler)
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(QueueHandler(log_queue))
+    log_listener = QueueListener(log_queue, *console_handlers, respect_handler_level=True)
+    log_listener.start()
+    # Flush the queued records on exit
+    atexit.register(log_listener.stop)
+
+    # Check if the Application Insights Instrumentation Key is set in the environment variables
+    instrumentation_key = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
+    if instrumentation_key:
+        # Don't trace the load balancer's health probes
+        os.environ.setdefault("OTEL_PYTHON_FASTAPI_EXCLUDED_URLS", "/health")
+        # Configure Application Insights if the Instrumentation Key is found. Only a share of
+        # the traces is exported (10% by default); set APPLICATIONINSIGHTS_SAMPLING_RATIO=1.0
+        # to export every request.
+        configure_azure_monitor(
+            connection_string=instrumentation_key,
+            sampling_ratio=float(os.getenv("APPLICATIONINSIGHTS_SAMPLING_RATIO") or "0.1"),
+        )
+        logging.info("Application Insights configured with the provided Instrumentation Key")
+    else:
+        # Log a warning if the Instrumentation Key is not found
+        logging.warning("No Application Insights Instrumentation Key found. Skipping configuration")
+
+    # Suppress INFO logs from 'azure.core.pipeline.policies.http_logging_policy'
+    logging.getLogger("azure.core.pipeline.policies.http_logging_policy").setLevel(
+        logging.WARNING
+    )
+    logging.getLogger("azure.identity.aio._internal").setLevel(logging.WARNING)
+
+    # Suppress info logs from OpenTelemetry exporter
+    logging.getLogger("azure.monitor.opentelemetry.exporter.export._base").setLevel(
+        logging.WARNING
+    )
+
+
+configure_monitoring()
+
+from chat import router as chat_router  # noqa: E402
+from history import router as history_router  # noqa: E402
+from history_sql import router as history_sql_router, close_fabric_db_connections  # noqa: E402
+from semantic_kernel.agents import AzureAIAgent, AzureAIAgentSettings  # noqa: E402
+from auth.azure_credential_utils import get_azure_credential_async  # noqa: E402
+
 
 @asynccontextmanager
 async def lifespan(fastapi_app: FastAPI):
     """
     Manages the application lifespan events for the FastAPI app.
 
-    On startup, initializes the Azure AI agent using the configuration and attaches it to the app state.
-    On shutdown, deletes the agent instance and performs any necessary cleanup.
+    On startup, initializes the Azure AI agent using the configuration, attaches it to the app state
+    and starts the background worker that deletes evicted threads.
+    On shutdown, drains that worker, deletes the cached conversation threads and the agent instance, and closes
+    the agent clients, their credentials and the pooled SQL database connections.
     """
-    from chat import ChatWithDataPlugin
+    from chat import ChatWithDataPlugin, delete_cached_threads, start_thread_deleter, stop_thread_deleter
 
     ai_agent_settings = AzureAIAgentSettings(endpoint=os.getenv("AZURE_AI_AGENT_ENDPOINT"))
+    credential = await get_azure_credential_async()
     client = AzureAIAgent.create_client(
-        credential=await get_azure_credential_async(),
+        credential=credential,
         endpoint=ai_agent_settings.endpoint,
     )
     agent = await client.agents.get_agent(
         agent_id=os.getenv("AGENT_ID_ORCHESTRATOR")
     )
     # print(f"Agent retrieved: {agent}")
+    chat_plugin = ChatWithDataPlugin()
     fastapi_app.state.orchestrator_agent = AzureAIAgent(
         client=client,
         definition=agent,
-        plugins=[ChatWithDataPlugin()]
+        plugins=[chat_plugin]
     )
+    start_thread_deleter(fastapi_app.state.orchestrator_agent)
     yield
+    await stop_thread_deleter()
+    await delete_cached_threads(fastapi_app.state.orchestrator_agent)
     fastapi_app.state.orchestrator_agent = None
+    # Close the clients and async credentials so their aiohttp sessions are not leaked
+    await chat_plugin.close()
+    await client.close()
+    await credential.close()
+    close_fabric_db_connections()
 
 
 def build_app() -> FastAPI:
@@ -58,7 +139,8 @@ def build_app() -> FastAPI:
     fastapi_app = FastAPI(
         title="Agentic Applications for Unified Data Foundation Solution Accelerator",
         version="1.0.0",
-        lifespan=lifespan
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse
     )
 
     fastapi_app.add_middleware(
@@ -67,6 +149,7 @@ def build_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
 
     # Include routers
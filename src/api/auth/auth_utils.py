@@ -2,6 +2,8 @@ import base64
 import json
 import logging
 
+from fastapi import Request
+
 
 def get_authenticated_user_details(request_headers):
     user_object = {}
@@ -27,6 +29,18 @@ def get_authenticated_user_details(request_headers):
     return user_object
 
 
+async def get_authenticated_user_id(request: Request):
+    """
+    FastAPI dependency returning the principal id of the caller.
+
+    FastAPI caches dependency results per request, so the auth headers are parsed once
+    however many dependants ask for the user. Only the principal id header is read: it is
+    what get_authenticated_user_details returns as user_principal_id, including None in
+    development mode, without copying every header into new dicts.
+    """
+    return request.headers.get("x-ms-client-principal-id")
+
+
 def get_tenantid(client_principal_b64):
     tenant_id = ""
     if client_principal_b64:
@@ -3,28 +3,28 @@ Chat API module for handling chat interactions and responses.
 """
 
 import asyncio
-import json
 import logging
 import os
 import random
 import re
 import time
 import uuid
-from types import SimpleNamespace
-from typing import Annotated, AsyncGenerator
+from dataclasses import dataclass
+from typing import Annotated, AsyncGenerator, Optional
 
+import aiohttp
+import orjson
 from cachetools import TTLCache
-from dotenv import load_dotenv
 from fastapi import APIRouter, Request, HTTPException, status
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from opentelemetry import trace
 from opentelemetry.trace import Status, StatusCode
 
 # Azure SDK
 from azure.ai.agents.models import TruncationObject, MessageRole, ListSortOrder
 from azure.monitor.events.extension import track_event
-from azure.monitor.opentelemetry import configure_azure_monitor
-from azure.ai.projects import AIProjectClient
+from azure.ai.projects.aio import AIProjectClient
+from azure.core.pipeline.transport import AioHttpTransport
 
 # Semantic Kernel
 from semantic_kernel.agents import AzureAIAgentThread
@@ -32,53 +32,96 @@ from semantic_kernel.exceptions.agent_exceptions import AgentException
 from semantic_kernel.functions.kernel_function_decorator import kernel_function
 
 # Azure Auth
-from auth.azure_credential_utils import get_azure_credential
-
-load_dotenv()
+from auth.azure_credential_utils import get_azure_credential_async
 
 # Constants
 HOST_NAME = "Agentic Applications for Unified Data Foundation"
 HOST_INSTRUCTIONS = "Answer questions about Sales, Products and Orders data."
+# Markdown code fences the SQL agent may wrap its query in
+SQL_FENCE_PATTERN = re.compile(r"```(?:sql)?", re.IGNORECASE)
+
+
+@dataclass(frozen=True, slots=True)
+class ChatSettings:
+    """Chat configuration, read from the environment once at import time."""
+    ai_project_endpoint: Optional[str]
+    ai_project_api_version: str
+    sql_agent_id: Optional[str]
+    chart_agent_id: Optional[str]
+    instrumentation_key: Optional[str]
+    stream_batch_size: int
+    stream_batch_seconds: float
+
+
+# The .env file is loaded by the app entry point before this module is imported
+SETTINGS = ChatSettings(
+    ai_project_endpoint=os.getenv("AZURE_AI_AGENT_ENDPOINT"),
+    ai_project_api_version=os.getenv("AZURE_AI_AGENT_API_VERSION", "2025-05-01"),
+    sql_agent_id=os.getenv("AGENT_ID_SQL"),
+    chart_agent_id=os.getenv("AGENT_ID_CHART"),
+    instrumentation_key=os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING"),
+    stream_batch_size=int(os.getenv("STREAM_BATCH_SIZE", "8")),
+    stream_batch_seconds=float(os.getenv("STREAM_BATCH_MS", "50")) / 1000,
+)
+
 
 router = APIRouter()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Check if the Application Insights Instrumentation Key is set in the environment variables
-instrumentation_key = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
-if instrumentation_key:
-    # Configure Application Insights if the Instrumentation Key is found
-    configure_azure_monitor(connection_string=instrumentation_key)
-    logging.info("Application Insights configured with the provided Instrumentation Key")
-else:
-    # Log a warning if the Instrumentation Key is not found
-    logging.warning("No Application Insights Instrumentation Key found. Skipping configuration")
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-
-# Suppress INFO logs from 'azure.core.pipeline.policies.http_logging_policy'
-logging.getLogger("azure.core.pipeline.policies.http_logging_policy").setLevel(
-    logging.WARNING
-)
-logging.getLogger("azure.identity.aio._internal").setLevel(logging.WARNING)
-
-# Suppress info logs from OpenTelemetry exporter
-logging.getLogger("azure.monitor.opentelemetry.exporter.export._base").setLevel(
-    logging.WARNING
-)
-
 
 class ChatWithDataPlugin:
     """Plugin for handling chat interactions with data using various AI agents."""
 
     def __init__(self):
-        self.ai_project_endpoint = os.getenv("AZURE_AI_AGENT_ENDPOINT")
-        self.ai_project_api_version = os.getenv("AZURE_AI_AGENT_API_VERSION", "2025-05-01")
-        self.foundry_sql_agent_id = os.getenv("AGENT_ID_SQL")
-        self.foundry_chart_agent_id = os.getenv("AGENT_ID_CHART")
+        self.ai_project_endpoint = SETTINGS.ai_project_endpoint
+        self.ai_project_api_version = SETTINGS.ai_project_api_version
+        self.foundry_sql_agent_id = SETTINGS.sql_agent_id
+        self.foundry_chart_agent_id = SETTINGS.chart_agent_id
+        self._project_client = None
+        self._credential = None
+        self._project_client_lock = asyncio.Lock()
+        self._pending_thread_deletes = set()
+
+    async def get_project_client(self):
+        """
+        Returns the async AIProjectClient shared by the plugin's kernel functions.
+
+        The client and its credential are created on first use and reused afterwards, so
+        the credential's token cache and the client's connection pool survive across calls.
+
+        Returns:
+            AIProjectClient: The shared project client.
+        """
+        if self._project_client is None:
+            async with self._project_client_lock:
+                if self._project_client is None:
+                    self._credential = await get_azure_credential_async()
+                    # Keep more idle connections, for longer, than aiohttp's defaults so
+                    # concurrent tool calls reuse warm TLS connections to the agent endpoint
+                    connector = aiohttp.TCPConnector(limit=200, keepalive_timeout=60, ttl_dns_cache=300)
+                    self._project_client = AIProjectClient(
+                        endpoint=self.ai_project_endpoint,
+                        credential=self._credential,
+                        api_version=self.ai_project_api_version,
+                        transport=AioHttpTransport(session=aiohttp.ClientSession(connector=connector), session_owner=True),
+                    )
+        return self._project_client
+
+    async def close(self):
+        """
+        Closes the shared project client and its credential, releasing their HTTP sessions.
+
+        Thread deletions still running in the background are awaited first.
+        """
+        if self._pending_thread_deletes:
+            await asyncio.gather(*self._pending_thread_deletes, return_exceptions=True)
+        if self._project_client is not None:
+            await self._project_client.close()
+            self._project_client = None
+        if self._credential is not None:
+            await self._credential.close()
+            self._credential = None
 
     @kernel_function(name="ChatWithSQLDatabase",
                      description="Provides quantified results, metrics, or structured data from the SQL database.")
@@ -100,36 +143,14 @@ class ChatWithDataPlugin:
         query = input
         try:
             from history_sql import run_sql_query
-            project_client = AIProjectClient(
-                endpoint=self.ai_project_endpoint,
-                credential=get_azure_credential(),
-                api_version=self.ai_project_api_version,
-            )
-
-            thread = project_client.agents.threads.create()
-
-            project_client.agents.messages.create(
-                thread_id=thread.id,
-                role=MessageRole.USER,
-                content=query,
-            )
-
-            run = project_client.agents.runs.create_and_process(
-                thread_id=thread.id,
-                agent_id=self.foundry_sql_agent_id,
-            )
-
-            if run.status == "failed":
-                print(f"Run failed: {run.last_error}")
+            sql_query = await self.run_agent(self.foundry_sql_agent_id, query)
+            if sql_query is None:
                 return "Details could not be retrieved. Please try again later."
 
-            sql_query = ""
-            messages = project_client.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING)
-            for msg in messages:
-                if msg.role == MessageRole.AGENT and msg.text_messages:
-                    sql_query = msg.text_messages[-1].text.value
-                    break
-            sql_query = sql_query.replace("```sql", '').replace("```", '').strip()
+            # Most replies are bare SQL, so the regex only runs when a fence is present
+            if "```" in sql_query:
+                sql_query = SQL_FENCE_PATTERN.sub("", sql_query)
+            sql_query = sql_query.strip()
             # logger.info("Generated SQL Query: %s", sql_query)
             answer_raw = await run_sql_query(sql_query)
             if isinstance(answer_raw, str):
@@ -137,14 +158,11 @@ class ChatWithDataPlugin:
             else:
                 answer = answer_raw or "No results found."
 
-            # Clean up
-            project_client.agents.threads.delete(thread_id=thread.id)
-
         except Exception as e:
-            print(f"Fabric-SQL-Kernel-error: {e}", flush=True)
+            logger.error("Fabric-SQL-Kernel-error: %s", e)
             answer = 'Details could not be retrieved. Please try again later.'
 
-        print(f"fabric-SQL-Kernel-response: {answer}", flush=True)
+        logger.debug("fabric-SQL-Kernel-response: %s", answer)
         return answer
 
     @kernel_function(name="GenerateChartData", description="Generates Chart.js v4.4.4 compatible JSON data for data visualization requests using current and immediate previous context.")
@@ -155,44 +173,75 @@ class ChatWithDataPlugin:
         query = input
         query = query.strip()
         try:
-            project_client = AIProjectClient(
-                endpoint=self.ai_project_endpoint,
-                credential=get_azure_credential(),
-                api_version=self.ai_project_api_version,
-            )
+            chartdata = await self.run_agent(self.foundry_chart_agent_id, query)
+            if chartdata is None:
+                return "Details could not be retrieved. Please try again later."
+
+        except Exception as e:
+            logger.error("fabric-Chat-Kernel-error: %s", e)
+            chartdata = 'Details could not be retrieved. Please try again later.'
+
+        logger.debug("fabric-Chat-Kernel-response: %s", chartdata)
+        return chartdata
+
+    async def run_agent(self, agent_id, query):
+        """
+        Runs a Foundry agent on a new thread and returns its reply.
+
+        Args:
+            agent_id (str): The ID of the agent to run.
+            query (str): The user message for the agent.
 
-            thread = project_client.agents.threads.create()
+        Returns:
+            str | None: The agent's last text message, or None if the run failed.
+        """
+        project_client = await self.get_project_client()
 
-            project_client.agents.messages.create(
+        thread = await project_client.agents.threads.create()
+        try:
+            await project_client.agents.messages.create(
                 thread_id=thread.id,
                 role=MessageRole.USER,
                 content=query,
             )
 
-            run = project_client.agents.runs.create_and_process(
+            run = await project_client.agents.runs.create_and_process(
                 thread_id=thread.id,
-                agent_id=self.foundry_chart_agent_id,
+                agent_id=agent_id,
             )
 
             if run.status == "failed":
-                print(f"Run failed: {run.last_error}")
-                return "Details could not be retrieved. Please try again later."
+                logger.error("Run failed: %s", run.last_error)
+                return None
 
-            chartdata = ""
-            messages = project_client.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING)
-            for msg in messages:
+            # The reply is the newest message on the thread, so read the list newest-first
+            reply = ""
+            messages = project_client.agents.messages.list(thread_id=thread.id, order=ListSortOrder.DESCENDING, limit=1)
+            async for msg in messages:
                 if msg.role == MessageRole.AGENT and msg.text_messages:
-                    chartdata = msg.text_messages[-1].text.value
+                    reply = msg.text_messages[-1].text.value
                     break
-            # Clean up
-            project_client.agents.threads.delete(thread_id=thread.id)
+            return reply
+        finally:
+            # Clean up the thread on every path, including failed runs and errors, without
+            # making the caller wait for the delete round-trip
+            task = asyncio.create_task(self._delete_thread(project_client, thread.id))
+            self._pending_thread_deletes.add(task)
+            task.add_done_callback(self._pending_thread_deletes.discard)
+
+    @staticmethod
+    async def _delete_thread(project_client, thread_id):
+        """
+        Deletes an agent thread, logging instead of raising on failure.
 
+        Args:
+            project_client (AIProjectClient): The client the thread was created with.
+            thread_id (str): The ID of the thread to delete.
+        """
+        try:
+            await project_client.agents.threads.delete(thread_id=thread_id)
         except Exception as e:
-            print(f"fabric-Chat-Kernel-error: {e}", flush=True)
-            chartdata = 'Details could not be retrieved. Please try again later.'
-
-        print(f"fabric-Chat-Kernel-response: {chartdata}", flush=True)
-        return chartdata
+            logger.error("Failed to delete thread %s: %s", thread_id, e)
 
 
 class ExpCache(TTLCache):
@@ -204,76 +253,158 @@ class ExpCache(TTLCache):
         self.agent = agent
 
     def expire(self, time=None):
-        """Remove expired items and delete associated Azure AI threads."""
+        """Remove expired items and queue their Azure AI threads for deletion."""
         items = super().expire(time)
-        for key, thread_id in items:
-            try:
-                if self.agent:
-                    thread = AzureAIAgentThread(client=self.agent.client, thread_id=thread_id)
-                    asyncio.create_task(thread.delete())
-                    logger.info("Thread deleted: %s", thread_id)
-            except Exception as e:
-                logger.error("Failed to delete thread for key %s: %s", key, e)
+        if self.agent:
+            for _, thread_id in items:
+                _delete_queue.put_nowait(thread_id)
         return items
 
     def popitem(self):
-        """Remove item using LRU eviction and delete associated Azure AI thread."""
+        """Remove item using LRU eviction and queue its Azure AI thread for deletion."""
         key, thread_id = super().popitem()
+        if self.agent:
+            _delete_queue.put_nowait(thread_id)
+        return key, thread_id
+
+
+# Threads evicted from the cache are deleted by a single background worker with bounded
+# concurrency, so a burst of expirations cannot flood the event loop and the connection
+# pool with delete calls while user requests are streaming. TTLCache only expires items
+# when it is written to, so a sweeper also expires idle entries periodically.
+THREAD_DELETE_CONCURRENCY = 8
+THREAD_CACHE_SWEEP_INTERVAL = 30.0
+_delete_queue: asyncio.Queue = asyncio.Queue()
+_thread_deleter_tasks: list = []
+
+
+async def _thread_deleter(agent):
+    """
+    Deletes the thread ids put on the delete queue, at most THREAD_DELETE_CONCURRENCY at a time.
+
+    Args:
+        agent (AzureAIAgent): The agent whose client owns the queued threads.
+    """
+    semaphore = asyncio.Semaphore(THREAD_DELETE_CONCURRENCY)
+    pending = set()
+
+    async def delete_thread(thread_id):
         try:
-            if self.agent:
-                thread = AzureAIAgentThread(client=self.agent.client, thread_id=thread_id)
-                asyncio.create_task(thread.delete())
-                logger.info("Thread deleted (LRU evict): %s", thread_id)
+            await AzureAIAgentThread(client=agent.client, thread_id=thread_id).delete()
+            logger.info("Thread deleted: %s", thread_id)
         except Exception as e:
-            logger.error("Failed to delete thread for key %s (LRU evict): %s", key, e)
-        return key, thread_id
+            logger.error("Failed to delete thread %s: %s", thread_id, e)
+        finally:
+            semaphore.release()
+            _delete_queue.task_done()
+
+    while True:
+        thread_id = await _delete_queue.get()
+        await semaphore.acquire()
+        task = asyncio.create_task(delete_thread(thread_id))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+
+async def _thread_cache_sweeper():
+    """
+    Expires the stale entries of the thread cache every THREAD_CACHE_SWEEP_INTERVAL seconds,
+    queueing their threads for deletion even when no request touches the cache.
+    """
+    while True:
+        await asyncio.sleep(THREAD_CACHE_SWEEP_INTERVAL)
+        if thread_cache is not None:
+            thread_cache.expire()
+
+
+def start_thread_deleter(agent):
+    """
+    Starts the background workers that expire the thread cache and delete the evicted threads.
+
+    Args:
+        agent (AzureAIAgent): The agent whose client owns the cached threads.
+    """
+    if not _thread_deleter_tasks:
+        _thread_deleter_tasks.append(asyncio.create_task(_thread_deleter(agent)))
+        _thread_deleter_tasks.append(asyncio.create_task(_thread_cache_sweeper()))
+
+
+async def stop_thread_deleter():
+    """
+    Waits for the queued thread deletions to finish, then stops the background workers.
+    """
+    if not _thread_deleter_tasks:
+        return
+    await _delete_queue.join()
+    for task in _thread_deleter_tasks:
+        task.cancel()
+    await asyncio.gather(*_thread_deleter_tasks, return_exceptions=True)
+    _thread_deleter_tasks.clear()
 
 
 def track_event_if_configured(event_name: str, event_data: dict):
     """Track event to Application Insights if configured."""
-    instrumentation_key = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
-    if instrumentation_key:
+    if SETTINGS.instrumentation_key:
         track_event(event_name, event_data)
     else:
         logging.warning("Skipping track_event for %s as Application Insights is not configured", event_name)
 
 
-def format_stream_response(chat_completion_chunk, history_metadata, apim_request_id):
-    """Format chat completion chunk into standardized response object."""
-    response_obj = {
-        "id": chat_completion_chunk.id,
-        "model": chat_completion_chunk.model,
-        "created": chat_completion_chunk.created,
-        "object": chat_completion_chunk.object,
-        "choices": [{"messages": []}],
-        "history_metadata": history_metadata,
-        "apim-request-id": apim_request_id,
-    }
-
-    if len(chat_completion_chunk.choices) > 0:
-        delta = chat_completion_chunk.choices[0].delta
-        if delta:
-            if hasattr(delta, "context"):
-                message_obj = {"role": "tool", "content": json.dumps(delta.context)}
-                response_obj["choices"][0]["messages"].append(message_obj)
-                return response_obj
-            if delta.role == "assistant" and hasattr(delta, "context"):
-                message_obj = {
-                    "role": "assistant",
-                    "context": delta.context,
-                }
-                response_obj["choices"][0]["messages"].append(message_obj)
-                return response_obj
-            else:
-                if delta.content:
-                    message_obj = {
-                        "role": "assistant",
-                        "content": delta.content,
-                    }
-                    response_obj["choices"][0]["messages"].append(message_obj)
-                    return response_obj
+class StreamFormatter:
+    """
+    Formats chat completion chunks into the standardized response object of one stream.
 
-    return {}
+    The envelope carrying the per-stream constant fields is built once and updated in place
+    for every chunk, so the returned object must be serialized before the next call.
+    """
+
+    def __init__(self, history_metadata, apim_request_id):
+        """Initialize the envelope with the fields shared by every chunk of the stream."""
+        self._choice = {"messages": []}
+        self._envelope = {
+            "id": None,
+            "model": None,
+            "created": None,
+            "object": None,
+            "choices": [self._choice],
+            "history_metadata": history_metadata,
+            "apim-request-id": apim_request_id,
+        }
+
+    def format(self, chat_completion_chunk):
+        """
+        Formats a chat completion chunk.
+
+        Args:
+            chat_completion_chunk (dict): The chunk, with id, model, created, object and choices keys.
+
+        Returns:
+            dict: The response object, or an empty dict if the chunk carries no message.
+        """
+        choices = chat_completion_chunk["choices"]
+        if len(choices) == 0:
+            return {}
+        delta = choices[0].get("delta")
+        if not delta:
+            return {}
+
+        if "context" in delta:
+            message_obj = {"role": "tool", "content": orjson.dumps(delta["context"]).decode("utf-8")}
+        elif delta.get("content"):
+            message_obj = {
+                "role": "assistant",
+                "content": delta["content"],
+            }
+        else:
+            return {}
+
+        envelope = self._envelope
+        envelope["id"] = chat_completion_chunk["id"]
+        envelope["model"] = chat_completion_chunk["model"]
+        envelope["created"] = chat_completion_chunk["created"]
+        envelope["object"] = chat_completion_chunk["object"]
+        self._choice["messages"] = [message_obj]
+        return envelope
 
 
 # Global thread cache
@@ -288,12 +419,38 @@ def get_thread_cache(agent):
     return thread_cache
 
 
+async def delete_cached_threads(agent):
+    """
+    Deletes every Azure AI agent thread still held in the global thread cache.
+
+    The deletions are independent, so they are issued concurrently; a failed delete is
+    logged and does not cancel the others.
+
+    Args:
+        agent (AzureAIAgent): The agent whose client owns the cached threads.
+    """
+    global thread_cache
+    if thread_cache is None or agent is None:
+        return
+
+    thread_ids = list(thread_cache.values())
+    thread_cache = None
+    results = await asyncio.gather(
+        *(AzureAIAgentThread(client=agent.client, thread_id=thread_id).delete() for thread_id in thread_ids),
+        return_exceptions=True,
+    )
+    for thread_id, result in zip(thread_ids, results):
+        if isinstance(result, Exception):
+            logger.error("Failed to delete thread %s: %s", thread_id, result)
+
+
 async def stream_openai_text(conversation_id: str, query: str, agent) -> AsyncGenerator[str, None]:
     """
     Get a streaming text response from OpenAI.
     """
     thread = None
-    complete_response = ""
+    # Only whether anything was received matters, so the streamed text is not accumulated
+    received_response = False
     try:
         if not query:
             query = "Please provide a query."
@@ -306,13 +463,20 @@ async def stream_openai_text(conversation_id: str, query: str, agent) -> AsyncGe
 
         truncation_strategy = TruncationObject(type="last_messages", last_messages=4)
 
+        thread_id_cached = False
         async for response in agent.invoke_stream(messages=query, thread=thread, truncation_strategy=truncation_strategy):
-            cache[conversation_id] = response.thread.id
-            complete_response += str(response.content)
+            # The thread id is the same for every chunk; writing it once per stream still
+            # refreshes the TTL of the conversation's entry
+            if not thread_id_cached:
+                cache[conversation_id] = response.thread.id
+                thread_id_cached = True
+            # content is a StreamingChatMessageContent, which is truthy even when its text is empty
+            if not received_response and str(response.content):
+                received_response = True
             yield response.content
 
     except RuntimeError as e:
-        complete_response = str(e)
+        received_response = True
         if "Rate limit is exceeded" in str(e):
             logger.error("Rate limit error: %s", e)
             raise AgentException(f"Rate limit is exceeded. {str(e)}") from e
@@ -321,13 +485,13 @@ async def stream_openai_text(conversation_id: str, query: str, agent) -> AsyncGe
             raise AgentException(f"An unexpected runtime error occurred: {str(e)}") from e
 
     except Exception as e:
-        complete_response = str(e)
+        received_response = True
         logger.error("Error in stream_openai_text: %s", e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error streaming OpenAI text") from e
 
     finally:
         # Provide a fallback response when no data is received from OpenAI.
-        if complete_response == "":
+        if not received_response:
             logger.info("No response received from OpenAI.")
             cache = get_thread_cache(agent)
             thread_id = cache.pop(conversation_id, None)
@@ -337,6 +501,59 @@ async def stream_openai_text(conversation_id: str, query: str, agent) -> AsyncGe
             yield "I cannot answer this question with the current data. Please rephrase or add more details."
 
 
+async def batch_stream(stream, max_items, max_wait):
+    """
+    Groups the items of an async stream into lists, so each list can be sent as one frame.
+
+    A list is yielded once it holds max_items items, or max_wait seconds after its first
+    item arrived, whichever comes first. Items received before the stream raises are
+    yielded before the exception is propagated.
+
+    Args:
+        stream (AsyncIterator): The stream to read.
+        max_items (int): The largest number of items in a list.
+        max_wait (float): How long, in seconds, to wait for more items once a list has started.
+
+    Yields:
+        list: The next items of the stream, in order.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = aiter(stream)
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(iterator))
+            try:
+                batch = [await pending]
+            except StopAsyncIteration:
+                return
+            pending = None
+            deadline = loop.time() + max_wait
+            finished = False
+            while len(batch) < max_items:
+                pending = asyncio.ensure_future(anext(iterator))
+                done, _ = await asyncio.wait({pending}, timeout=max(deadline - loop.time(), 0))
+                if not done:
+                    # Keep waiting for this item as the start of the next list
+                    break
+                item, pending = pending, None
+                try:
+                    batch.append(item.result())
+                except StopAsyncIteration:
+                    finished = True
+                    break
+                except Exception:
+                    yield batch
+                    raise
+            yield batch
+            if finished:
+                return
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
 async def stream_chat_request(request_body, conversation_id, query, agent):
     """
     Handles streaming chat requests.
@@ -345,45 +562,32 @@ async def stream_chat_request(request_body, conversation_id, query, agent):
 
     async def generate():
         try:
-            assistant_content = ""
-            async for chunk in stream_openai_text(conversation_id, query, agent):
-                if isinstance(chunk, dict):
-                    chunk = json.dumps(chunk)  # Convert dict to JSON string
-                assistant_content += str(chunk)
-
-                if assistant_content:
-                    chat_completion_chunk = {
-                        "id": "",
-                        "model": "",
-                        "created": 0,
-                        "object": "",
-                        "choices": [
-                            {
-                                "messages": [],
-                                "delta": {},
-                            }
-                        ],
-                        "history_metadata": history_metadata,
-                        "apim-request-id": "",
-                    }
-
-                    chat_completion_chunk["id"] = str(uuid.uuid4())
-                    chat_completion_chunk["model"] = "rag-model"
+            # Every chunk belongs to the same completion, so the id is generated once per response
+            completion_id = str(uuid.uuid4())
+            formatter = StreamFormatter(history_metadata, "")
+            # The chunk is built once and only its timestamp and content change per token
+            delta = {"role": "assistant", "content": ""}
+            chat_completion_chunk = {
+                "id": completion_id,
+                "model": "rag-model",
+                "created": 0,
+                "object": "extensions.chat.completion.chunk",
+                "choices": [{"delta": delta}],
+            }
+            # Chunks arriving close together are sent as one frame, which cuts the number of
+            # serializations and socket writes without delaying a slow stream
+            chunks = stream_openai_text(conversation_id, query, agent)
+            async for batch in batch_stream(chunks, SETTINGS.stream_batch_size, SETTINGS.stream_batch_seconds):
+                # Each frame carries only the new text; the client concatenates the deltas
+                chunk_text = "".join(
+                    orjson.dumps(chunk).decode("utf-8") if isinstance(chunk, dict) else str(chunk)
+                    for chunk in batch
+                )
+
+                if chunk_text:
                     chat_completion_chunk["created"] = int(time.time())
-                    chat_completion_chunk["object"] = "extensions.chat.completion.chunk"
-                    chat_completion_chunk["choices"][0]["messages"].append(
-                        {"role": "assistant", "content": assistant_content}
-                    )
-                    chat_completion_chunk["choices"][0]["delta"] = {
-                        "role": "assistant",
-                        "content": assistant_content,
-                    }
-
-                    completion_chunk_obj = json.loads(
-                        json.dumps(chat_completion_chunk),
-                        object_hook=lambda d: SimpleNamespace(**d),
-                    )
-                    yield json.dumps(format_stream_response(completion_chunk_obj, history_metadata, "")) + "\n\n"
+                    delta["content"] = chunk_text
+                    yield orjson.dumps(formatter.format(chat_completion_chunk)) + b"\n\n"
 
         except AgentException as e:
             error_message = str(e)
@@ -396,16 +600,16 @@ async def stream_chat_request(request_body, conversation_id, query, agent):
                 error_response = {
                     "error": f"Rate limit exceeded. Please try again after {retry_after}."
                 }
-                yield json.dumps(error_response) + "\n\n"
+                yield orjson.dumps(error_response) + b"\n\n"
             else:
                 logger.error("Agent exception: %s", error_message)
                 error_response = {"error": "An error occurred. Please try again later."}
-                yield json.dumps(error_response) + "\n\n"
+                yield orjson.dumps(error_response) + b"\n\n"
 
         except Exception as e:
             logger.error("Unexpected error: %s", e)
             error_response = {"error": "An error occurred while processing the request."}
-            yield json.dumps(error_response) + "\n\n"
+            yield orjson.dumps(error_response) + b"\n\n"
 
     return generate()
 
@@ -437,4 +641,4 @@ async def conversation(request: Request):
         if span is not None:
             span.record_exception(ex)
             span.set_status(Status(StatusCode.ERROR, str(ex)))
-        return JSONResponse(content={"error": "An internal error occurred while processing the conversation."}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error occurred while processing the conversation."}, status_code=500)
@@ -8,45 +8,22 @@ from azure.cosmos import exceptions
 from azure.cosmos.aio import CosmosClient
 from azure.identity.aio import get_bearer_token_provider
 from azure.monitor.events.extension import track_event
-from azure.monitor.opentelemetry import configure_azure_monitor
-from fastapi import APIRouter, HTTPException, Query, Request, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse
 from openai import AsyncAzureOpenAI
 from opentelemetry import trace
 from opentelemetry.trace import Status, StatusCode
 
 # from chat import adjust_processed_data_dates
-from auth.auth_utils import get_authenticated_user_details
+from auth.auth_utils import get_authenticated_user_id
 from auth.azure_credential_utils import get_azure_credential_async
 
 router = APIRouter()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Check if the Application Insights Instrumentation Key is set in the environment variables
-instrumentation_key = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
-if instrumentation_key:
-    # Configure Application Insights if the Instrumentation Key is found
-    configure_azure_monitor(connection_string=instrumentation_key)
-    logging.info("Application Insights configured with the provided Instrumentation Key")
-else:
-    # Log a warning if the Instrumentation Key is not found
-    logger.warning("Application Insights Instrumentation Key not found in environment variables")
-
-# Suppress INFO logs from 'azure.core.pipeline.policies.http_logging_policy'
-logging.getLogger("azure.core.pipeline.policies.http_logging_policy").setLevel(
-    logging.WARNING
-)
-logging.getLogger("azure.identity.aio._internal").setLevel(logging.WARNING)
-
-# Suppress info logs from OpenTelemetry exporter
-logging.getLogger("azure.monitor.opentelemetry.exporter.export._base").setLevel(
-    logging.WARNING
-)
-
 # Configuration variables
+APPLICATIONINSIGHTS_ENABLED = bool(os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING"))
 USE_CHAT_HISTORY_ENABLED = os.getenv("USE_CHAT_HISTORY_ENABLED", "false").strip().lower() == "true"
 AZURE_COSMOSDB_DATABASE = os.getenv("AZURE_COSMOSDB_DATABASE")
 AZURE_COSMOSDB_ACCOUNT = os.getenv("AZURE_COSMOSDB_ACCOUNT")
@@ -67,8 +44,7 @@ AZURE_OPENAI_RESOURCE = os.getenv("AZURE_OPENAI_RESOURCE")
 
 def track_event_if_configured(event_name: str, event_data: dict):
     """Track events to Application Insights if configured."""
-    instrumentation_key = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
-    if instrumentation_key:
+    if APPLICATIONINSIGHTS_ENABLED:
         track_event(event_name, event_data)
     else:
         logging.warning("Skipping track_event for %s as Application Insights is not configured", event_name)
@@ -500,21 +476,18 @@ async def update_message_feedback(
         message_feedback: str) -> Optional[dict]:
     """Update feedback for a specific message."""
     try:
-        logger.info(
-            f"Updating feedback for message_id: {message_id} by user: {user_id}")
+        logger.info("Updating feedback for message_id: %s by user: %s", message_id, user_id)
         cosmos_conversation_client = init_cosmosdb_client()
         updated_message = await cosmos_conversation_client.update_message_feedback(user_id, message_id, message_feedback)
 
         if updated_message:
-            logger.info(
-                f"Successfully updated message_id: {message_id} with feedback: {message_feedback}")
+            logger.info("Successfully updated message_id: %s with feedback: %s", message_id, message_feedback)
             return updated_message
         else:
-            logger.warning(f"Message ID {message_id} not found or access denied")
+            logger.warning("Message ID %s not found or access denied", message_id)
             return None
     except Exception:
-        logger.exception(
-            f"Error updating message feedback for message_id: {message_id}")
+        logger.exception("Error updating message feedback for message_id: %s", message_id)
         raise
 
 
@@ -536,12 +509,11 @@ async def delete_conversation(user_id: str, conversation_id: str) -> bool:
         conversation = await cosmos_conversation_client.get_conversation(user_id, conversation_id)
 
         if not conversation:
-            logger.warning(f"Conversation {conversation_id} not found.")
+            logger.warning("Conversation %s not found.", conversation_id)
             return False
 
         if conversation["userId"] != user_id:
-            logger.warning(
-                f"User {user_id} does not have permission to delete {conversation_id}.")
+            logger.warning("User %s does not have permission to delete %s.", user_id, conversation_id)
             return False
 
         # Delete associated messages first (if applicable)
@@ -550,11 +522,11 @@ async def delete_conversation(user_id: str, conversation_id: str) -> bool:
         # Delete the conversation itself
         await cosmos_conversation_client.delete_conversation(user_id, conversation_id)
 
-        logger.info(f"Successfully deleted conversation {conversation_id}.")
+        logger.info("Successfully deleted conversation %s.", conversation_id)
         return True
 
     except Exception as e:
-        logger.exception(f"Error deleting conversation {conversation_id}: {e}")
+        logger.exception("Error deleting conversation %s: %s", conversation_id, e)
         return False
 
 
@@ -577,7 +549,7 @@ async def get_conversations(user_id: str, offset: int, limit: Optional[int]):
 
         return conversations or []
     except Exception:
-        logger.exception(f"Error retrieving conversations for user {user_id}")
+        logger.exception("Error retrieving conversations for user %s", user_id)
         return []
 
 
@@ -600,7 +572,7 @@ async def get_messages(user_id: str, conversation_id: str):
         # Fetch conversation to ensure it exists and belongs to the user
         conversation = await cosmos_conversation_client.get_conversation(user_id, conversation_id)
         if not conversation:
-            logger.warning(f"Conversation {conversation_id} not found.")
+            logger.warning("Conversation %s not found.", conversation_id)
             return []
 
         # Fetch messages associated with the conversation
@@ -608,8 +580,7 @@ async def get_messages(user_id: str, conversation_id: str):
         return messages
 
     except Exception as e:
-        logger.exception(
-            f"Error retrieving messages for conversation {conversation_id}: {e}")
+        logger.exception("Error retrieving messages for conversation %s: %s", conversation_id, e)
         return []
 
 
@@ -632,8 +603,7 @@ async def get_conversation_messages(user_id: str, conversation_id: str):
         # Fetch the conversation details
         conversation = await cosmos_conversation_client.get_conversation(user_id, conversation_id)
         if not conversation:
-            logger.warning(
-                f"Conversation {conversation_id} not found for user {user_id}.")
+            logger.warning("Conversation %s not found for user %s.", conversation_id, user_id)
             return None
 
         # Get messages related to the conversation
@@ -653,8 +623,7 @@ async def get_conversation_messages(user_id: str, conversation_id: str):
 
         return messages
     except Exception:
-        logger.exception(
-            f"Error retrieving conversation {conversation_id} for user {user_id}")
+        logger.exception("Error retrieving conversation %s for user %s", conversation_id, user_id)
         return None
 
 
@@ -677,24 +646,22 @@ async def clear_messages(user_id: str, conversation_id: str) -> bool:
         # Ensure the conversation exists and belongs to the user
         conversation = await cosmos_conversation_client.get_conversation(user_id, conversation_id)
         if not conversation:
-            logger.warning(f"Conversation {conversation_id} not found.")
+            logger.warning("Conversation %s not found.", conversation_id)
             return False
 
         if conversation["user_id"] != user_id:
             logger.warning(
-                f"User {user_id} does not have permission to clear messages in {conversation_id}.")
+                "User %s does not have permission to clear messages in %s.", user_id, conversation_id)
             return False
 
         # Delete all messages associated with the conversation
         await cosmos_conversation_client.delete_messages(conversation_id, user_id)
 
-        logger.info(
-            f"Successfully cleared messages in conversation {conversation_id}.")
+        logger.info("Successfully cleared messages in conversation %s.", conversation_id)
         return True
 
     except Exception as e:
-        logger.exception(
-            f"Error clearing messages for conversation {conversation_id}: {e}")
+        logger.exception("Error clearing messages for conversation %s: %s", conversation_id, e)
         return False
 
 
@@ -705,19 +672,15 @@ async def ensure_cosmos():
         success, err = await cosmos_conversation_client.ensure()
         return success, err
     except Exception as e:
-        logger.exception(f"Error ensuring CosmosDB configuration: {e}")
+        logger.exception("Error ensuring CosmosDB configuration: %s", e)
         return False, str(e)
 
 
 # Route handlers
 @router.post("/generate")
-async def add_conversation_route(request: Request):
+async def add_conversation_route(request: Request, user_id: Optional[str] = Depends(get_authenticated_user_id)):
     """Route handler for adding a new conversation."""
     try:
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
         # Parse request body
         request_json = await request.json()
 
@@ -729,22 +692,18 @@ async def add_conversation_route(request: Request):
         return response
 
     except Exception as e:
-        logger.exception("Exception in /generate: %s", str(e))
+        logger.exception("Exception in /generate: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.post("/update")
-async def update_conversation_route(request: Request):
+async def update_conversation_route(request: Request, user_id: Optional[str] = Depends(get_authenticated_user_id)):
     """Route handler for updating a conversation."""
     try:
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
         # Parse request body
         request_json = await request.json()
         conversation_id = request_json.get("conversation_id")
@@ -763,7 +722,7 @@ async def update_conversation_route(request: Request):
             "title": update_response["title"]
         })
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "success": True,
                 "data": {
@@ -775,22 +734,18 @@ async def update_conversation_route(request: Request):
             status_code=200,
         )
     except Exception as e:
-        logger.exception("Exception in /history/update: %s", str(e))
+        logger.exception("Exception in /history/update: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.post("/message_feedback")
-async def update_message_feedback_route(request: Request):
+async def update_message_feedback_route(request: Request, user_id: Optional[str] = Depends(get_authenticated_user_id)):
     """Route handler for updating message feedback."""
     try:
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
         # Parse request body
         request_json = await request.json()
         message_id = request_json.get("message_id")
@@ -819,7 +774,7 @@ async def update_message_feedback_route(request: Request):
                 "message_id": message_id,
                 "feedback": message_feedback
             })
-            return JSONResponse(
+            return ORJSONResponse(
                 content={
                     "message": f"Successfully updated message with feedback {message_feedback}",
                     "message_id": message_id,
@@ -837,22 +792,18 @@ async def update_message_feedback_route(request: Request):
             )
 
     except Exception as e:
-        logger.exception("Exception in /history/message_feedback: %s", str(e))
+        logger.exception("Exception in /history/message_feedback: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.delete("/delete")
-async def delete_conversation_route(request: Request):
+async def delete_conversation_route(request: Request, user_id: Optional[str] = Depends(get_authenticated_user_id)):
     """Route handler for deleting a conversation."""
     try:
-        # Get the user ID from request headers
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
         # Parse request body
         request_json = await request.json()
         conversation_id = request_json.get("conversation_id")
@@ -870,7 +821,7 @@ async def delete_conversation_route(request: Request):
                 "user_id": user_id,
                 "conversation_id": conversation_id
             })
-            return JSONResponse(
+            return ORJSONResponse(
                 content={
                     "message": "Successfully deleted conversation and messages",
                     "conversation_id": conversation_id},
@@ -885,28 +836,24 @@ async def delete_conversation_route(request: Request):
                 status_code=404,
                 detail=f"Conversation {conversation_id} not found or user does not have permission.")
     except Exception as e:
-        logger.exception("Exception in /history/delete: %s", str(e))
+        logger.exception("Exception in /history/delete: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.get("/list")
 async def list_conversations(
-    request: Request,
+    user_id: Optional[str] = Depends(get_authenticated_user_id),
     offset: int = Query(0, alias="offset"),
     limit: int = Query(25, alias="limit")
 ):
     """Route handler for listing conversations."""
     try:
         # await adjust_processed_data_dates()
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
-        logger.info(f"user_id: {user_id}, offset: {offset}, limit: {limit}")
+        logger.info("user_id: %s, offset: %s, limit: %s", user_id, offset, limit)
 
         # Get conversations
         conversations = await get_conversations(user_id, offset=offset, limit=limit)
@@ -917,7 +864,7 @@ async def list_conversations(
                 "offset": offset,
                 "limit": limit
             })
-            return JSONResponse(
+            return ORJSONResponse(
                 content={
                     "error": f"No conversations for {user_id} were found"},
                 status_code=404)
@@ -927,25 +874,21 @@ async def list_conversations(
             "limit": limit,
             "conversation_count": len(conversations)
         })
-        return JSONResponse(content=conversations, status_code=200)
+        return ORJSONResponse(content=conversations, status_code=200)
 
     except Exception as e:
-        logger.exception("Exception in /history/list: %s", str(e))
+        logger.exception("Exception in /history/list: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.post("/read")
-async def get_conversation_messages_route(request: Request):
+async def get_conversation_messages_route(request: Request, user_id: Optional[str] = Depends(get_authenticated_user_id)):
     """Route handler for reading conversation messages."""
     try:
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
         # Parse request body
         request_json = await request.json()
         conversation_id = request_json.get("conversation_id")
@@ -974,29 +917,25 @@ async def get_conversation_messages_route(request: Request):
             "message_count": len(conversationMessages)
         })
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "conversation_id": conversation_id,
                 "messages": conversationMessages},
             status_code=200)
 
     except Exception as e:
-        logger.exception("Exception in /history/read: %s", str(e))
+        logger.exception("Exception in /history/read: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.post("/rename")
-async def rename_conversation_route(request: Request):
+async def rename_conversation_route(request: Request, user_id: Optional[str] = Depends(get_authenticated_user_id)):
     """Route handler for renaming a conversation."""
     try:
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
         # Parse request body
         request_json = await request.json()
         conversation_id = request_json.get("conversation_id")
@@ -1023,26 +962,21 @@ async def rename_conversation_route(request: Request):
             "new_title": title
         })
 
-        return JSONResponse(content=rename_result, status_code=200)
+        return ORJSONResponse(content=rename_result, status_code=200)
 
     except Exception as e:
-        logger.exception("Exception in /history/rename: %s", str(e))
+        logger.exception("Exception in /history/rename: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.delete("/delete_all")
-async def delete_all_conversations(request: Request):
+async def delete_all_conversations(user_id: Optional[str] = Depends(get_authenticated_user_id)):
     """Route handler for deleting all conversations for a user."""
     try:
-        # Get the user ID from request headers
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
         # Get all user conversations
         conversations = await get_conversations(user_id, offset=0, limit=None)
         if not conversations:
@@ -1061,30 +995,25 @@ async def delete_all_conversations(request: Request):
             "deleted_count": len(conversations)
         })
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "message": f"Successfully deleted all conversations for user {user_id}"},
             status_code=200,
         )
 
     except Exception as e:
-        logging.exception("Exception in /history/delete_all: %s", str(e))
+        logging.exception("Exception in /history/delete_all: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.post("/clear")
-async def clear_messages_route(request: Request):
+async def clear_messages_route(request: Request, user_id: Optional[str] = Depends(get_authenticated_user_id)):
     """Route handler for clearing messages in a conversation."""
     try:
-        # Get the user ID from request headers
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
         # Parse request body
         request_json = await request.json()
         conversation_id = request_json.get("conversation_id")
@@ -1112,18 +1041,18 @@ async def clear_messages_route(request: Request):
             "conversation_id": conversation_id
         })
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "message": "Successfully cleared messages"},
             status_code=200)
 
     except Exception as e:
-        logger.exception("Exception in /history/clear: %s", str(e))
+        logger.exception("Exception in /history/clear: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.get("/history/ensure")
@@ -1135,7 +1064,7 @@ async def ensure_cosmos_route():
             track_event_if_configured("CosmosDBEnsureFailed", {
                 "error": err or "Unknown error occurred"
             })
-            return JSONResponse(
+            return ORJSONResponse(
                 content={
                     "error": err or "Unknown error occurred"},
                 status_code=422)
@@ -1143,12 +1072,12 @@ async def ensure_cosmos_route():
             "status": "CosmosDB is configured and working"
         })
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "message": "CosmosDB is configured and working"},
             status_code=200)
     except Exception as e:
-        logger.exception("Exception in /history/ensure: %s", str(e))
+        logger.exception("Exception in /history/ensure: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
@@ -1156,11 +1085,11 @@ async def ensure_cosmos_route():
         cosmos_exception = str(e)
 
         if "Invalid credentials" in cosmos_exception:
-            return JSONResponse(content={"error": "Invalid credentials"}, status_code=401)
+            return ORJSONResponse(content={"error": "Invalid credentials"}, status_code=401)
         elif "Invalid CosmosDB database name" in cosmos_exception or "Invalid CosmosDB container name" in cosmos_exception:
-            return JSONResponse(content={"error": "Invalid CosmosDB configuration"}, status_code=422)
+            return ORJSONResponse(content={"error": "Invalid CosmosDB configuration"}, status_code=422)
         else:
-            return JSONResponse(
+            return ORJSONResponse(
                 content={
                     "error": "CosmosDB is not configured or not working"},
                 status_code=500)
@@ -1,55 +1,35 @@
+import asyncio
+import base64
+import hashlib
 import json
 import logging
 import os
 import struct
+import threading
+import time
 import uuid
 from datetime import datetime, date
-from typing import Tuple, Any
+from typing import Any, Optional, Tuple
 
 from openai import AsyncAzureOpenAI
+import orjson
 import pyodbc
 from azure.identity.aio import AzureCliCredential, get_bearer_token_provider
 from azure.monitor.events.extension import track_event
-from azure.monitor.opentelemetry import configure_azure_monitor
-from fastapi import APIRouter, HTTPException, Query, Request, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse, Response
 from opentelemetry import trace
 from opentelemetry.trace import Status, StatusCode
 
-from auth.auth_utils import get_authenticated_user_details
+from auth.auth_utils import get_authenticated_user_id
 from auth.azure_credential_utils import get_azure_credential_async
 
 router = APIRouter()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Check if the Application Insights Instrumentation Key is set in the environment variables
-instrumentation_key = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
-if instrumentation_key:
-    # Configure Application Insights if the Instrumentation Key is found
-    configure_azure_monitor(connection_string=instrumentation_key)
-    logging.info("Historyfab API: Application Insights configured with the provided Instrumentation Key")
-else:
-    # Log a warning if the Instrumentation Key is not found
-    logging.warning("Historyfab API: No Application Insights Instrumentation Key found. Skipping configuration")
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-
-# Suppress INFO logs from 'azure.core.pipeline.policies.http_logging_policy'
-logging.getLogger("azure.core.pipeline.policies.http_logging_policy").setLevel(
-    logging.WARNING
-)
-logging.getLogger("azure.identity.aio._internal").setLevel(logging.WARNING)
-
-# Suppress info logs from OpenTelemetry exporter
-logging.getLogger("azure.monitor.opentelemetry.exporter.export._base").setLevel(
-    logging.WARNING
-)
-
 # Configuration variables
+APPLICATIONINSIGHTS_ENABLED = bool(os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING"))
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_DEPLOYMENT_MODEL = os.getenv("AZURE_OPENAI_DEPLOYMENT_MODEL")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
@@ -64,20 +44,68 @@ def track_event_if_configured(event_name: str, event_data: dict):
         event_name (str): The name of the event to track.
         event_data (dict): The data to associate with the event.
     """
-    instrumentation_key = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
-    if instrumentation_key:
+    if APPLICATIONINSIGHTS_ENABLED:
         track_event(event_name, event_data)
     else:
         logging.warning("Skipping track_event for %s as Application Insights is not configured", event_name)
 
 
+# Idle connections kept for reuse, so requests skip the TLS handshake and Entra ID login.
+# The server drops sessions that stay idle, so connections idle for longer than
+# FABRIC_SQL_POOL_IDLE_SECONDS are closed instead of being reused.
+FABRIC_SQL_POOL_SIZE = int(os.getenv("FABRIC_SQL_POOL_SIZE", "10"))
+FABRIC_SQL_POOL_IDLE_SECONDS = float(os.getenv("FABRIC_SQL_POOL_IDLE_SECONDS", "240"))
+SQL_COPT_SS_ACCESS_TOKEN = 1256
+# (connection, time.monotonic() when it was released), oldest first. Queries run on worker
+# threads release their connection from that thread, so the list is only used under the lock.
+_idle_connections = []
+_pool_lock = threading.Lock()
+_dev_access_token = None
+
+
+async def get_dev_access_token_struct():
+    """
+    Returns the Azure CLI access token for the SQL database, packed for SQL_COPT_SS_ACCESS_TOKEN.
+
+    The token is cached until five minutes before it expires, so `az` is not invoked for
+    every new connection.
+
+    Returns:
+        bytes: The packed access token.
+    """
+    global _dev_access_token
+    if _dev_access_token is None or _dev_access_token[0] - 300 < time.time():
+        async with AzureCliCredential() as credential:
+            token = await credential.get_token("https://database.windows.net/.default")
+        token_bytes = token.token.encode("utf-16-LE")
+        token_struct = struct.pack(
+            f"<I{len(token_bytes)}s",
+            len(token_bytes),
+            token_bytes
+        )
+        _dev_access_token = (token.expires_on, token_struct)
+    return _dev_access_token[1]
+
+
 async def get_fabric_db_connection():
     """
-    Get a connection to the SQL database.
+    Get a connection to the SQL database, reusing an idle pooled connection when one is available.
+
+    Connections are opened in autocommit mode, since every statement is committed on its own.
+    Return them with release_fabric_db_connection instead of closing them.
 
     Returns:
         Connection: Database connection object, or None if connection fails.
     """
+    discard_stale_fabric_db_connections()
+    while True:
+        with _pool_lock:
+            if not _idle_connections:
+                break
+            conn, _ = _idle_connections.pop()
+        if not conn.closed:
+            return conn
+
     app_env = os.getenv("APP_ENV", "prod").lower()
     database = os.getenv("FABRIC_SQL_DATABASE")
     server = os.getenv("FABRIC_SQL_SERVER")
@@ -86,41 +114,24 @@ async def get_fabric_db_connection():
     api_uid = os.getenv("API_UID", "")
     fabric_sql_connection_string18 = os.getenv("FABRIC_SQL_CONNECTION_STRING", "")
     fabric_sql_connection_string17 = f"DRIVER={driver17};SERVER={server};DATABASE={database};UID={api_uid};Authentication=ActiveDirectoryMSI"
-    
 
-    try:       
+    try:
         conn = None
-        try:            
+        try:
             if app_env == 'dev':
-                async with AzureCliCredential() as credential:
-                    token = await credential.get_token("https://database.windows.net/.default")
-                    token_bytes = token.token.encode("utf-16-LE")
-                    token_struct = struct.pack(
-                        f"<I{len(token_bytes)}s",
-                        len(token_bytes),
-                        token_bytes
-                    )
-                    SQL_COPT_SS_ACCESS_TOKEN = 1256
-                    connection_string = f"DRIVER={driver18};SERVER={server};DATABASE={database};"
-                    conn = pyodbc.connect(connection_string, attrs_before={SQL_COPT_SS_ACCESS_TOKEN: token_struct})
+                token_struct = await get_dev_access_token_struct()
+                connection_string = f"DRIVER={driver18};SERVER={server};DATABASE={database};"
+                conn = pyodbc.connect(connection_string, attrs_before={SQL_COPT_SS_ACCESS_TOKEN: token_struct}, autocommit=True)
             else:
                 # connection_string = f"DRIVER={driver};SERVER={server};DATABASE={database};UID={api_uid};Authentication=ActiveDirectoryMSI;"
-                conn = pyodbc.connect(fabric_sql_connection_string18)
-        except Exception as e:
+                conn = pyodbc.connect(fabric_sql_connection_string18, autocommit=True)
+        except Exception:
             if app_env == 'dev':
-                async with AzureCliCredential() as credential:
-                    token = await credential.get_token("https://database.windows.net/.default")
-                    token_bytes = token.token.encode("utf-16-LE")
-                    token_struct = struct.pack(
-                        f"<I{len(token_bytes)}s",
-                        len(token_bytes),
-                        token_bytes
-                    )
-                    SQL_COPT_SS_ACCESS_TOKEN = 1256
-                    connection_string = f"DRIVER={driver17};SERVER={server};DATABASE={database};"
-                    conn = pyodbc.connect(connection_string, attrs_before={SQL_COPT_SS_ACCESS_TOKEN: token_struct})
+                token_struct = await get_dev_access_token_struct()
+                connection_string = f"DRIVER={driver17};SERVER={server};DATABASE={database};"
+                conn = pyodbc.connect(connection_string, attrs_before={SQL_COPT_SS_ACCESS_TOKEN: token_struct}, autocommit=True)
             else:
-                conn = pyodbc.connect(fabric_sql_connection_string17)
+                conn = pyodbc.connect(fabric_sql_connection_string17, autocommit=True)
 
         return conn
     except pyodbc.Error as e:
@@ -128,6 +139,62 @@ async def get_fabric_db_connection():
         return None
 
 
+def release_fabric_db_connection(conn, discard=False):
+    """
+    Returns a connection to the pool, or closes it if it failed or the pool is full.
+
+    Args:
+        conn (Connection): The connection obtained from get_fabric_db_connection.
+        discard (bool): Close the connection instead of reusing it, e.g. after an error.
+    """
+    if conn is None:
+        return
+    discard_stale_fabric_db_connections()
+    if not discard and not conn.closed:
+        with _pool_lock:
+            if len(_idle_connections) < FABRIC_SQL_POOL_SIZE:
+                _idle_connections.append((conn, time.monotonic()))
+                return
+    close_fabric_db_connection(conn)
+
+
+def close_fabric_db_connection(conn):
+    """
+    Closes a connection, ignoring the error raised if the server already dropped it.
+
+    Args:
+        conn (Connection): The connection to close.
+    """
+    try:
+        conn.close()
+    except pyodbc.Error:
+        pass
+
+
+def discard_stale_fabric_db_connections():
+    """
+    Closes the pooled connections that have been idle for longer than FABRIC_SQL_POOL_IDLE_SECONDS.
+    """
+    stale_before = time.monotonic() - FABRIC_SQL_POOL_IDLE_SECONDS
+    stale = []
+    with _pool_lock:
+        while _idle_connections and _idle_connections[0][1] < stale_before:
+            stale.append(_idle_connections.pop(0)[0])
+    for conn in stale:
+        close_fabric_db_connection(conn)
+
+
+def close_fabric_db_connections():
+    """
+    Closes every idle pooled connection. Called on application shutdown.
+    """
+    with _pool_lock:
+        connections = [conn for conn, _ in _idle_connections]
+        _idle_connections.clear()
+    for conn in connections:
+        close_fabric_db_connection(conn)
+
+
 async def run_query_and_return_json(sql_query: str):
     """
     Execute SQL query and return results as JSON string.
@@ -141,6 +208,7 @@ async def run_query_and_return_json(sql_query: str):
     # Connect to the database
     conn = await get_fabric_db_connection()
     cursor = None
+    discard = True
     try:
         cursor = conn.cursor()
         cursor.execute(sql_query)
@@ -155,6 +223,7 @@ async def run_query_and_return_json(sql_query: str):
                     row_dict[col_name] = value
             result.append(row_dict)
 
+        discard = False
         return json.dumps(result, indent=2)
     except Exception as e:
         logging.error("Error executing SQL query: %s", e)
@@ -162,7 +231,7 @@ async def run_query_and_return_json(sql_query: str):
     finally:
         if cursor:
             cursor.close()
-        conn.close()
+        release_fabric_db_connection(conn, discard)
 
 
 async def run_query_and_return_json_params(sql_query, params: Tuple[Any, ...] = ()):
@@ -179,6 +248,7 @@ async def run_query_and_return_json_params(sql_query, params: Tuple[Any, ...] =
     # Connect to the database
     conn = await get_fabric_db_connection()
     cursor = None
+    discard = True
     try:
         cursor = conn.cursor()
         cursor.execute(sql_query, params)
@@ -193,6 +263,7 @@ async def run_query_and_return_json_params(sql_query, params: Tuple[Any, ...] =
                     row_dict[col_name] = value
             result.append(row_dict)
 
+        discard = False
         return json.dumps(result, indent=2)
     except Exception as e:
         logging.error("Error executing SQL query: %s", e)
@@ -200,7 +271,7 @@ async def run_query_and_return_json_params(sql_query, params: Tuple[Any, ...] =
     finally:
         if cursor:
             cursor.close()
-        conn.close()
+        release_fabric_db_connection(conn, discard)
 
 
 async def run_nonquery_params(sql_query, params: Tuple[Any, ...] = ()):
@@ -216,10 +287,12 @@ async def run_nonquery_params(sql_query, params: Tuple[Any, ...] = ()):
     """
     conn = await get_fabric_db_connection()
     cursor = None
+    discard = True
     try:
         cursor = conn.cursor()
         cursor.execute(sql_query, params)
         conn.commit()
+        discard = False
         return True
     except Exception as e:
         logging.error("Error executing SQL query: %s", e)
@@ -227,7 +300,7 @@ async def run_nonquery_params(sql_query, params: Tuple[Any, ...] = ()):
     finally:
         if cursor:
             cursor.close()
-        conn.close()
+        release_fabric_db_connection(conn, discard)
 
 
 async def run_query_params(sql_query, params: Tuple[Any, ...] = ()):
@@ -244,6 +317,7 @@ async def run_query_params(sql_query, params: Tuple[Any, ...] = ()):
     # Connect to the database
     conn = await get_fabric_db_connection()
     cursor = None
+    discard = True
     try:
         cursor = conn.cursor()
         cursor.execute(sql_query, params)
@@ -258,6 +332,7 @@ async def run_query_params(sql_query, params: Tuple[Any, ...] = ()):
                     row_dict[col_name] = value
             result.append(row_dict)
 
+        discard = False
         return result
     except Exception as e:
         logging.error("Error executing SQL query: %s", e)
@@ -265,7 +340,56 @@ async def run_query_params(sql_query, params: Tuple[Any, ...] = ()):
     finally:
         if cursor:
             cursor.close()
-        conn.close()
+        release_fabric_db_connection(conn, discard)
+
+
+async def fetch_query_params(sql_query, params: Tuple[Any, ...] = ()):
+    """
+    Execute parameterized SQL query on a worker thread and return its rows as dictionaries.
+
+    The connection is released by the worker thread before this returns, so it is never held
+    while the caller sends the response.
+
+    Args:
+        sql_query (str): The SQL query to execute with parameter placeholders.
+        params (Tuple[Any, ...]): Parameters to bind to the query.
+
+    Returns:
+        list: List of dictionaries containing query results.
+
+    Raises:
+        Exception: If the connection or the query fails.
+    """
+    def fetch_rows(conn):
+        # The connection is released here rather than by the caller, so a cancelled request
+        # never closes it while the worker thread is still using it
+        cursor = None
+        discard = True
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql_query, params)
+            columns = [desc[0] for desc in cursor.description]
+            result = []
+            for row in cursor.fetchall():
+                row_dict = {}
+                for col_name, value in zip(columns, row):
+                    if isinstance(value, (datetime, date)):
+                        row_dict[col_name] = value.isoformat()
+                    else:
+                        row_dict[col_name] = value
+                result.append(row_dict)
+
+            discard = False
+            return result
+        finally:
+            if cursor:
+                cursor.close()
+            release_fabric_db_connection(conn, discard)
+
+    conn = await get_fabric_db_connection()
+    if conn is None:
+        raise ConnectionError("Could not connect to the Fabric SQL database")
+    return await asyncio.to_thread(fetch_rows, conn)
 
 
 async def execute_sql_query(sql_query):
@@ -274,11 +398,13 @@ async def execute_sql_query(sql_query):
     """
     conn = await get_fabric_db_connection()
     cursor = None
+    discard = True
     try:
         cursor = conn.cursor()
         cursor.execute(sql_query)
         result = ''.join(str(row) for row in cursor.fetchall())
 
+        discard = False
         return result
     except Exception as e:
         logging.error("Error executing SQL query: %s", e)
@@ -286,71 +412,138 @@ async def execute_sql_query(sql_query):
     finally:
         if cursor:
             cursor.close()
-        conn.close()
+        release_fabric_db_connection(conn, discard)
 
 
 async def run_sql_query(sql_query):
     """
     Execute parameterized SQL query and return results as list of dictionaries.
+
+    The query is run on a worker thread: the agent-generated analytical queries can take
+    seconds, and pyodbc would otherwise block the event loop for all other requests.
     """
+    def fetch_rows(conn):
+        # The connection is released here rather than by the caller, so a cancelled request
+        # never closes it while the worker thread is still using it
+        cursor = None
+        discard = True
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql_query)
+            columns = [desc[0] for desc in cursor.description]
+            result = []
+            for row in cursor.fetchall():
+                row_dict = {}
+                for col_name, value in zip(columns, row):
+                    if isinstance(value, (datetime, date)):
+                        row_dict[col_name] = value.isoformat()
+                    else:
+                        row_dict[col_name] = value
+                result.append(row_dict)
+
+            discard = False
+            return result
+        finally:
+            if cursor:
+                cursor.close()
+            release_fabric_db_connection(conn, discard)
+
     # Connect to the database
     conn = await get_fabric_db_connection()
-    cursor = None
     try:
-        cursor = conn.cursor()
-        cursor.execute(sql_query)
-        columns = [desc[0] for desc in cursor.description]
-        result = []
-        for row in cursor.fetchall():
-            row_dict = {}
-            for col_name, value in zip(columns, row):
-                if isinstance(value, (datetime, date)):
-                    row_dict[col_name] = value.isoformat()
-                else:
-                    row_dict[col_name] = value
-            result.append(row_dict)
-
-        return result
+        return await asyncio.to_thread(fetch_rows, conn)
     except Exception as e:
         logging.error("Error executing SQL query: %s", e)
         return None
-    finally:
-        if cursor:
-            cursor.close()
-        conn.close()
+
 
 # Configuration variable
 USE_CHAT_HISTORY_ENABLED = os.getenv("USE_CHAT_HISTORY_ENABLED", "true").lower() == "true"
 
 
-async def get_conversations(user_id, limit, sort_order="DESC", offset=0):
+def encode_conversation_cursor(conversation):
+    """
+    Builds the continuation cursor that resumes a conversation listing after the given row.
+
+    Args:
+        conversation (dict): The last conversation of the current page.
+
+    Returns:
+        str: An opaque, URL-safe cursor.
+    """
+    payload = json.dumps([conversation["updatedAt"], conversation["conversation_id"]])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_conversation_cursor(cursor):
+    """
+    Decodes a cursor produced by encode_conversation_cursor.
+
+    Args:
+        cursor (str): The continuation cursor.
+
+    Returns:
+        tuple: The (updatedAt, conversation_id) of the last row of the previous page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        updated_at, conversation_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    return updated_at, conversation_id
+
+
+async def get_conversations(user_id, limit, sort_order="DESC", offset=0, cursor=None):
     """
     Retrieve conversations for a specific user with pagination and sorting.
 
+    With a cursor, the page is read by seeking past the last row of the previous page on
+    (updatedAt, conversation_id), so every page costs the same regardless of its depth.
+    Without one, the deprecated offset is applied.
+
     Args:
         user_id (str): The ID of the user whose conversations to retrieve.
-        limit (int): Maximum number of conversations to return.
+        limit (int): Maximum number of conversations to return, or None for all of them.
         sort_order (str): Sort order for conversations ("DESC" or "ASC").
-        offset (int): Number of conversations to skip for pagination.
+        offset (int): Number of conversations to skip for pagination. Ignored when a cursor is given.
+        cursor (str): Continuation cursor returned with the previous page.
 
     Returns:
         list: List of conversation dictionaries.
 
     Raises:
+        ValueError: If the cursor is malformed.
         Exception: If an error occurs during conversation retrieval.
     """
     try:
-        query = ""
-        params = ()
+        conditions = []
+        params = []
         if user_id:
-            query = f"SELECT conversation_id, title, createdAt, updatedAt FROM hst_conversations where userId = ? order by updatedAt {sort_order}"
-            params = (user_id,)
-        else:  # If no user_id is provided, return all conversations -- This is for local testing purposes
-            query = f"SELECT conversation_id, title, createdAt, updatedAt FROM hst_conversations ORDER BY updatedAt {sort_order}"
-            params = ()
+            conditions.append("userId = ?")
+            params.append(user_id)
+        # If no user_id is provided, return all conversations -- This is for local testing purposes
 
-        result = await run_query_params(query, params)
+        if cursor:
+            updated_at, conversation_id = decode_conversation_cursor(cursor)
+            op = "<" if sort_order == "DESC" else ">"
+            conditions.append(f"(updatedAt {op} ? OR (updatedAt = ? AND conversation_id {op} ?))")
+            params.extend((updated_at, updated_at, conversation_id))
+            offset = 0
+
+        query = "SELECT conversation_id, title, createdAt, updatedAt FROM hst_conversations"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY updatedAt {sort_order}, conversation_id {sort_order}"
+        if limit is not None:
+            query += " OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+            params.extend((offset, limit))
+
+        result = await run_query_params(query, tuple(params))
         return result
+    except ValueError:
+        raise
     except Exception:
         logger.exception("Error in get_conversation")
         raise
@@ -363,55 +556,43 @@ async def get_conversation_messages(user_id: str, conversation_id: str, sort_ord
     Args:
         user_id (str): The ID of the user requesting the messages.
         conversation_id (str): The ID of the conversation to retrieve.
+        sort_order (str): Sort order for messages ("ASC" or "DESC").
 
     Returns:
-        list: List of message dictionaries with deserialized citations, or None if an error occurs.
-    """
-    try:
-        if not conversation_id:
-            logger.warning("No conversation_id found, cannot retrieve conversation messages.")
-            return None
+        list: List of message dictionaries with deserialized citations and content.
 
-        query = ""
-        params = ()
-        if user_id:
-            query = f"SELECT role, content, citations, feedback FROM hst_conversation_messages where userId = ? and conversation_id = ? order by updatedAt {sort_order}"
-            params = (user_id, conversation_id)
-        else:  # If no user_id is provided, return all conversation messages -- This is for local testing purposes
-            query = f"SELECT role, content, citations, feedback FROM hst_conversation_messages where conversation_id = ? order by updatedAt {sort_order}"
-            params = (conversation_id,)
-
-        result = await run_query_params(query, params)
-        # Process the result to deserialize citations
-        processed_result = []
-        for message in result:
-            processed_message = dict(message)
-            # Deserialize citations from JSON string back to list
-            if processed_message.get("citations"):
-                try:
-                    processed_message["citations"] = json.loads(processed_message["citations"])
-                except (json.JSONDecodeError, TypeError) as e:
-                    logger.warning("Failed to deserialize citations: %s", e)
-                    processed_message["citations"] = []
-            else:
+    Raises:
+        Exception: If an error occurs while reading the messages.
+    """
+    if user_id:
+        query = f"SELECT role, content, citations, feedback FROM hst_conversation_messages where userId = ? and conversation_id = ? order by updatedAt {sort_order}"
+        params = (user_id, conversation_id)
+    else:  # If no user_id is provided, return all conversation messages -- This is for local testing purposes
+        query = f"SELECT role, content, citations, feedback FROM hst_conversation_messages where conversation_id = ? order by updatedAt {sort_order}"
+        params = (conversation_id,)
+
+    messages = await fetch_query_params(query, params)
+    for processed_message in messages:
+        # Deserialize citations from JSON string back to list
+        if processed_message.get("citations"):
+            try:
+                processed_message["citations"] = json.loads(processed_message["citations"])
+            except (json.JSONDecodeError, TypeError) as e:
+                logger.warning("Failed to deserialize citations: %s", e)
                 processed_message["citations"] = []
+        else:
+            processed_message["citations"] = []
 
-            # Deserialize content if it's a JSON string
-            content = processed_message.get("content")
-            if isinstance(content, str):
-                try:
-                    # Try to parse as JSON
-                    processed_message["content"] = json.loads(content)
-                except (json.JSONDecodeError, TypeError):
-                    # Leave as string if not JSON
-                    processed_message["content"] = content
-            processed_result.append(processed_message)
-
-        return processed_result
-    except Exception:
-        logger.exception(
-            "Error retrieving conversation %s for user %s", conversation_id, user_id)
-        return None
+        # Deserialize content if it's a JSON string
+        content = processed_message.get("content")
+        if isinstance(content, str):
+            try:
+                # Try to parse as JSON
+                processed_message["content"] = json.loads(content)
+            except (json.JSONDecodeError, TypeError):
+                # Leave as string if not JSON
+                processed_message["content"] = content
+    return messages
 
 
 async def delete_conversation(user_id: str, conversation_id: str) -> bool:
@@ -469,44 +650,43 @@ async def delete_conversation(user_id: str, conversation_id: str) -> bool:
         return False
 
 
-async def delete_all_conversations(user_id: str) -> bool:
+async def delete_all_conversations(user_id: str) -> Optional[int]:
     """
-    Delete all conversations and messages for a specific user.
+    Delete all conversations and messages for a specific user in a single transaction.
 
     Args:
         user_id (str): The ID of the user whose conversations should be deleted.
 
     Returns:
-        bool: True if all conversations were successfully deleted, False otherwise.
+        int: The number of conversations deleted, or None if the deletion failed.
     """
-    try:
-
-        if user_id:
-            # Delete all associated messages
-            query_m = "DELETE FROM hst_conversation_messages WHERE userId = ?"
-            messages_result = await run_nonquery_params(query_m, (user_id,))
-
-            # Delete all conversations
-            query_c = "DELETE FROM hst_conversations WHERE userId = ?"
-            conversations_result = await run_nonquery_params(query_c, (user_id,))
-        else:
-            # If user_id is None, delete all conversations without user filtering
-            query_m = "DELETE FROM hst_conversation_messages"
-            messages_result = await run_nonquery_params(query_m)
-
-            query_c = "DELETE FROM hst_conversations"
-            conversations_result = await run_nonquery_params(query_c)
-
-        # Verify deletion was successful
-        if messages_result is False or conversations_result is False:
-            logger.error("Failed to delete all conversations for user %s", user_id)
-            return False
-
-        return True
+    if user_id:
+        where, params = " WHERE userId = ?", (user_id,)
+    else:
+        # If user_id is None, delete all conversations without user filtering
+        where, params = "", ()
 
+    conn = await get_fabric_db_connection()
+    cursor = None
+    discard = True
+    try:
+        conn.autocommit = False
+        cursor = conn.cursor()
+        # Delete all associated messages, then the conversations
+        cursor.execute("DELETE FROM hst_conversation_messages" + where, params)
+        cursor.execute("DELETE FROM hst_conversations" + where, params)
+        deleted_count = cursor.rowcount
+        conn.commit()
+        conn.autocommit = True
+        discard = False
+        return deleted_count
     except Exception as e:
         logger.exception("Error deleting all conversations for user %s: %s", user_id, e)
-        return False
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        release_fabric_db_connection(conn, discard)
 
 
 async def rename_conversation(user_id: str, conversation_id, title) -> bool:
@@ -728,7 +908,7 @@ async def create_message(uuid, conversation_id, user_id, input_message: dict):
         content = input_message["content"]
         if isinstance(content, dict):
             content = json.dumps(content)
-            print(content)
+            logger.debug("create_message: serialized %d characters of content for conversation %s", len(content), conversation_id)
         params = (user_id, conversation_id, input_message["role"], input_message["id"],
                   content, citations_json, feedback, utc_now, utc_now)
         resp = await run_nonquery_params(query, params)
@@ -850,19 +1030,29 @@ async def update_conversation(user_id: str, request_json: dict):
 @router.get("/list")
 async def list_conversations(
     request: Request,
+    user_id: Optional[str] = Depends(get_authenticated_user_id),
     offset: int = Query(0, alias="offset"),
-    limit: int = Query(25, alias="limit")
+    limit: int = Query(25, alias="limit"),
+    cursor: Optional[str] = Query(None, alias="cursor")
 ):
     """
     List conversations for authenticated user with pagination.
 
+    The response body stays a list of conversations. When the page is full, the cursor for
+    the next page is returned in the X-Next-Cursor header; offset is deprecated in favour of it.
+    Pages carry an ETag of their content and must be revalidated on every use, so a list is
+    never served stale after a conversation changes; a matching If-None-Match is answered
+    with 304 Not Modified, which saves sending the body.
+
     Args:
-        request (Request): FastAPI request object containing authentication headers.
-        offset (int): Number of conversations to skip for pagination.
+        request (Request): FastAPI request object, used for the If-None-Match header.
+        user_id (str): The authenticated user's principal id.
+        offset (int): Deprecated. Number of conversations to skip for pagination.
         limit (int): Maximum number of conversations to return.
+        cursor (str): Continuation cursor from the X-Next-Cursor header of the previous page.
 
     Returns:
-        JSONResponse: Response containing list of conversations or error message.
+        ORJSONResponse: Response containing list of conversations or error message.
 
     Raises:
         HTTPException: If authentication fails or validation errors occur.
@@ -871,14 +1061,13 @@ async def list_conversations(
         # from chat import adjust_processed_data_dates
         # await adjust_processed_data_dates()
 
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
         logger.info("Historyfab list-API: user_id: %s, offset: %s, limit: %s", user_id, offset, limit)
 
         # Get conversations
-        conversations = await get_conversations(user_id, offset=offset, limit=limit)
+        try:
+            conversations = await get_conversations(user_id, offset=offset, limit=limit, cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
         if user_id:
             track_event_if_configured("ConversationsListed", {
                 "user_id": user_id,
@@ -887,38 +1076,45 @@ async def list_conversations(
                 "conversation_count": len(conversations)
             })
 
-        return JSONResponse(content=conversations, status_code=200)
+        body = orjson.dumps(conversations)
+        etag = '"' + hashlib.blake2b(f"{user_id}:".encode("utf-8") + body, digest_size=16).hexdigest() + '"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+        if conversations and len(conversations) == limit:
+            headers["X-Next-Cursor"] = encode_conversation_cursor(conversations[-1])
+        if offset and not cursor:
+            headers["Deprecation"] = "true"
+            headers["Warning"] = '299 - "offset is deprecated, use the X-Next-Cursor header as cursor instead"'
+        return Response(content=body, status_code=200, headers=headers, media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception("Exception in /historyfab/list: %s", str(e))
+        logger.exception("Exception in /historyfab/list: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.get("/read")
-async def get_conversation_messages_endpoint(request: Request, id: str = Query(...)):
+async def get_conversation_messages_endpoint(user_id: Optional[str] = Depends(get_authenticated_user_id), id: str = Query(...)):
     """
     Get messages for a specific conversation.
 
     Args:
-        request (Request): FastAPI request object containing authentication headers.
+        user_id (str): The authenticated user's principal id.
         id (str): The conversation ID to retrieve messages for.
 
     Returns:
-        JSONResponse: Response containing conversation messages or error message.
+        ORJSONResponse: Response containing conversation messages or error message.
 
     Raises:
         HTTPException: If authentication fails, conversation not found, or validation errors occur.
     """
     try:
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
         conversation_id = id
 
         if not conversation_id:
@@ -930,8 +1126,8 @@ async def get_conversation_messages_endpoint(request: Request, id: str = Query(.
             raise HTTPException(status_code=400, detail="conversation_id is required")
 
         # Get conversation message details
-        conversationMessages = await get_conversation_messages(user_id, conversation_id)
-        if not conversationMessages or len(conversationMessages) == 0:
+        conversation_messages = await get_conversation_messages(user_id, conversation_id)
+        if not conversation_messages:
             if user_id:
                 track_event_if_configured("ReadConversationNotFound", {
                     "user_id": user_id,
@@ -946,45 +1142,40 @@ async def get_conversation_messages_endpoint(request: Request, id: str = Query(.
             track_event_if_configured("ConversationRead", {
                 "user_id": user_id,
                 "conversation_id": conversation_id,
-                "message_count": len(conversationMessages)
+                "message_count": len(conversation_messages)
             })
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "conversation_id": conversation_id,
-                "messages": conversationMessages},
+                "messages": conversation_messages},
             status_code=200)
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception("Exception in /historyfab/read: %s", str(e))
+        logger.exception("Exception in /historyfab/read: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.delete("/delete")
-async def delete_conversation_endpoint(request: Request, id: str = Query(...)):
+async def delete_conversation_endpoint(user_id: Optional[str] = Depends(get_authenticated_user_id), id: str = Query(...)):
     """
     Delete a specific conversation and its messages.
 
     Args:
-        request (Request): FastAPI request object containing authentication headers.
+        user_id (str): The authenticated user's principal id.
         id (str): The conversation ID to delete.
 
     Returns:
-        JSONResponse: Response indicating success or failure.
+        Response: 204 No Content on success, or a JSON error response.
 
     Raises:
         HTTPException: If authentication fails, conversation not found, or user lacks permission.
     """
     try:
-        # Get the user ID from request headers
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
         conversation_id = id
         if not conversation_id:
             track_event_if_configured("DeleteConversationValidationError", {
@@ -1001,12 +1192,7 @@ async def delete_conversation_endpoint(request: Request, id: str = Query(...)):
                     "user_id": user_id,
                     "conversation_id": conversation_id
                 })
-            return JSONResponse(
-                content={
-                    "message": "Successfully deleted conversation and messages",
-                    "conversation_id": conversation_id},
-                status_code=200,
-            )
+            return Response(status_code=204)
         else:
             if user_id:
                 track_event_if_configured("DeleteConversationNotFound", {
@@ -1019,62 +1205,51 @@ async def delete_conversation_endpoint(request: Request, id: str = Query(...)):
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception("Exception in /historyfab/delete: %s", str(e))
+        logger.exception("Exception in /historyfab/delete: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.delete("/delete_all")
-async def delete_all_conversations_endpoint(request: Request):
+async def delete_all_conversations_endpoint(user_id: Optional[str] = Depends(get_authenticated_user_id)):
     """
     Delete all conversations for authenticated user.
 
     Args:
-        request (Request): FastAPI request object containing authentication headers.
+        user_id (str): The authenticated user's principal id.
 
     Returns:
-        JSONResponse: Response indicating success or failure.
+        Response: 204 No Content on success, or a JSON error response.
 
     Raises:
         HTTPException: If authentication fails or no conversations found.
     """
     try:
-        # Get the user ID from request headers
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
         # if not user_id:
         #     track_event_if_configured("DeleteAllConversationsValidationError", {
         #         "error": "user_id is missing",
         #         "user_id": user_id
         #     })
         #     raise HTTPException(status_code=400, detail="user_id is required")
-        # Get all user conversations
-        conversations = await get_conversations(user_id, offset=0, limit=None)
-        if not conversations:
+        # Delete all conversations
+        deleted_count = await delete_all_conversations(user_id)
+        if deleted_count == 0:
             track_event_if_configured("DeleteAllConversationsNotFound", {
                 "user_id": user_id
             })
             raise HTTPException(status_code=404,
                                 detail=f"No conversations for {user_id} were found")
 
-        # Delete all conversations
-        deleted = await delete_all_conversations(user_id)
-        if deleted:
+        if deleted_count:
             if user_id:
                 track_event_if_configured("AllConversationsDeleted", {
                     "user_id": user_id,
-                    "deleted_count": len(conversations)
+                    "deleted_count": deleted_count
                 })
-            return JSONResponse(
-                content={
-                    "message": f"Successfully deleted all conversations for user {user_id}"},
-                status_code=200,
-            )
+            return Response(status_code=204)
         else:
             if user_id:
                 track_event_if_configured("DeleteAllConversationsNotFound", {
@@ -1086,35 +1261,32 @@ async def delete_all_conversations_endpoint(request: Request):
     except HTTPException:
         raise
     except Exception as e:
-        logging.exception("Exception in /historyfab/delete_all: %s", str(e))
+        logging.exception("Exception in /historyfab/delete_all: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.post("/rename")
-async def rename_conversation_endpoint(request: Request):
+async def rename_conversation_endpoint(request: Request, user_id: Optional[str] = Depends(get_authenticated_user_id)):
     """
     Rename a conversation's title.
 
     Args:
-        request (Request): FastAPI request object containing authentication headers and JSON body with conversation_id and title.
+        request (Request): FastAPI request object containing the JSON body with conversation_id and title.
+        user_id (str): The authenticated user's principal id.
 
     Returns:
-        JSONResponse: Response indicating success or failure.
+        Response: 204 No Content on success, or a JSON error response.
 
     Raises:
         HTTPException: If authentication fails, validation errors occur, or conversation not found.
     """
     try:
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
         # Parse request body
-        request_json = await request.json()
+        request_json = orjson.loads(await request.body())
         conversation_id = request_json.get("conversation_id")
         title = request_json.get("title")
 
@@ -1142,11 +1314,7 @@ async def rename_conversation_endpoint(request: Request):
                     "conversation_id": conversation_id,
                     "new_title": title
                 })
-            return JSONResponse(
-                content={
-                    "message": f"Successfully renamed title of conversation {conversation_id} to title '{title}'"},
-                status_code=200,
-            )
+            return Response(status_code=204)
         else:
             if user_id:
                 track_event_if_configured("ConversationRenamedTitleNotFound", {
@@ -1160,35 +1328,32 @@ async def rename_conversation_endpoint(request: Request):
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception("Exception in /historyfab/rename: %s", str(e))
+        logger.exception("Exception in /historyfab/rename: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
 @router.post("/update")
-async def update_conversation_endpoint(request: Request):
+async def update_conversation_endpoint(request: Request, user_id: Optional[str] = Depends(get_authenticated_user_id)):
     """
     Update conversation with new messages.
 
     Args:
-        request (Request): FastAPI request object containing authentication headers and JSON body with conversation data.
+        request (Request): FastAPI request object containing the JSON body with conversation data.
+        user_id (str): The authenticated user's principal id.
 
     Returns:
-        JSONResponse: Response containing updated conversation details or error message.
+        ORJSONResponse: Response containing updated conversation details or error message.
 
     Raises:
         HTTPException: If authentication fails or validation errors occur.
     """
     try:
-        authenticated_user = get_authenticated_user_details(
-            request_headers=request.headers)
-        user_id = authenticated_user["user_principal_id"]
-
         # Parse request body
-        request_json = await request.json()
+        request_json = orjson.loads(await request.body())
         conversation_id = request_json.get("conversation_id")
         # logging.info("FABRIC-fab-update_conversation-request_json: %s" % request_json)
         if not conversation_id:
@@ -1206,7 +1371,7 @@ async def update_conversation_endpoint(request: Request):
                 })
             raise HTTPException(status_code=500, detail="Failed to update conversation")
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "success": True,
                 "data": {
@@ -1220,9 +1385,9 @@ async def update_conversation_endpoint(request: Request):
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception("Exception in /historyfab/update: %s", str(e))
+        logger.exception("Exception in /historyfab/update: %s", e)
         span = trace.get_current_span()
         if span is not None:
             span.record_exception(e)
             span.set_status(Status(StatusCode.ERROR, str(e)))
-        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+        return ORJSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
@@ -0,0 +1,105 @@
+"""
+Unit tests for the Fabric SQL connection pool in history_sql.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pyodbc")
+pytest.importorskip("fastapi")
+
+import history_sql  # noqa: E402
+
+pytestmark = pytest.mark.unittest
+
+
+class FakeConnection:
+    """Stands in for a pyodbc connection, recording whether it was closed."""
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the clock used by the pool with one the test moves forward by hand."""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(history_sql, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+@pytest.fixture(autouse=True)
+def empty_pool(monkeypatch):
+    """Starts every test with an empty pool and a fake driver."""
+    monkeypatch.setattr(history_sql, "_idle_connections", [])
+    monkeypatch.setattr(history_sql, "FABRIC_SQL_POOL_SIZE", 2)
+    monkeypatch.setattr(history_sql, "FABRIC_SQL_POOL_IDLE_SECONDS", 60.0)
+    monkeypatch.setenv("APP_ENV", "prod")
+    monkeypatch.setattr(history_sql.pyodbc, "connect", lambda *args, **kwargs: FakeConnection())
+
+
+def get_connection():
+    return asyncio.run(history_sql.get_fabric_db_connection())
+
+
+def test_released_connection_is_reused(clock):
+    conn = get_connection()
+    history_sql.release_fabric_db_connection(conn)
+
+    assert get_connection() is conn
+    assert not conn.closed
+
+
+def test_connection_idle_too_long_is_closed(clock):
+    conn = get_connection()
+    history_sql.release_fabric_db_connection(conn)
+    clock.value += 61
+
+    new_conn = get_connection()
+
+    assert new_conn is not conn
+    assert conn.closed
+    assert history_sql._idle_connections == []
+
+
+def test_recently_released_connection_outlives_stale_one(clock):
+    stale, fresh = get_connection(), get_connection()
+    history_sql.release_fabric_db_connection(stale)
+    clock.value += 50
+    history_sql.release_fabric_db_connection(fresh)
+    clock.value += 20
+
+    assert get_connection() is fresh
+    assert stale.closed
+
+
+def test_discarded_connection_is_closed(clock):
+    conn = get_connection()
+    history_sql.release_fabric_db_connection(conn, discard=True)
+
+    assert conn.closed
+    assert history_sql._idle_connections == []
+
+
+def test_pool_keeps_at_most_pool_size_connections(clock):
+    connections = [get_connection() for _ in range(3)]
+    for conn in connections:
+        history_sql.release_fabric_db_connection(conn)
+
+    assert [conn for conn, _ in history_sql._idle_connections] == connections[:2]
+    assert connections[2].closed
+
+
+def test_close_fabric_db_connections_empties_pool(clock):
+    connections = [get_connection() for _ in range(2)]
+    for conn in connections:
+        history_sql.release_fabric_db_connection(conn)
+
+    history_sql.close_fabric_db_connections()
+
+    assert history_sql._idle_connections == []
+    assert all(conn.closed for conn in connections)
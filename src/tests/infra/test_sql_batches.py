@@ -0,0 +1,63 @@
+"""
+Unit tests for the sample data SQL batching in infra/scripts/fabric_scripts/sql_batches.py.
+"""
+from decimal import Decimal
+
+import pytest
+
+from sql_batches import split_sql, split_statements
+
+pytestmark = pytest.mark.unittest
+
+
+def test_semicolon_inside_string_literal_does_not_split_statement():
+    script = "CREATE TABLE t (a nvarchar(10), b int);\nINSERT INTO t (a, b) VALUES ('x;y', 1);"
+
+    assert split_statements(script) == [
+        "CREATE TABLE t (a nvarchar(10), b int)",
+        "INSERT INTO t (a, b) VALUES ('x;y', 1)",
+    ]
+    assert split_sql(script)[1] == ("executemany", "INSERT INTO t (a, b) VALUES (?, ?)", [("x;y", 1)])
+
+
+def test_doubled_quotes_are_unescaped():
+    batches = split_sql("INSERT INTO t (a) VALUES ('it''s'), ('''quoted''')")
+
+    assert batches == [("executemany", "INSERT INTO t (a) VALUES (?)", [("it's",), ("'quoted'",)])]
+
+
+def test_null_becomes_none():
+    batches = split_sql("INSERT INTO t (a, b, c) VALUES (NULL, 'x', -1.5), ('y', null, 2)")
+
+    assert batches == [
+        ("executemany", "INSERT INTO t (a, b, c) VALUES (?, ?, ?)", [(None, "x", Decimal("-1.5")), ("y", None, 2)]),
+    ]
+
+
+def test_numbers_are_bound_as_numbers():
+    (_, _, params), = split_sql("INSERT INTO t (a, b, c, d) VALUES (42, 2.0, -7, '42')")
+
+    assert params == [(42, Decimal("2.0"), -7, "42")]
+    assert [type(value) for value in params[0]] == [int, Decimal, int, str]
+
+
+def test_insert_with_expressions_falls_back_to_execute():
+    statement = "INSERT INTO t (a, b) VALUES (GETDATE(), 1)"
+
+    assert split_sql(statement + ";") == [("execute", statement)]
+
+
+def test_consecutive_inserts_into_same_table_are_merged():
+    script = (
+        "INSERT INTO t (a) VALUES ('1');\n"
+        "INSERT INTO t (a) VALUES ('2'), ('3');\n"
+        "INSERT INTO u (a) VALUES ('4');\n"
+        "GO\n"
+        "DROP TABLE t;"
+    )
+
+    assert split_sql(script) == [
+        ("executemany", "INSERT INTO t (a) VALUES (?)", [("1",), ("2",), ("3",)]),
+        ("executemany", "INSERT INTO u (a) VALUES (?)", [("4",)]),
+        ("execute", "DROP TABLE t"),
+    ]